@@ -39,7 +39,11 @@ export class SimController {
     this.#isHealthy = null;
     this.#connectedClients = new Map();
     this.#data = { initial: null, extra: { typeInfos, sliderInfos }, merged: null };
-    this.#workerController = new WorkerController(`${this.title}-worker`, `${this.#URL}/dynamic`);
+    this.#workerController = new WorkerController(`${this.title}-worker`, `${this.#URL}/dynamic`, {
+      fetchDelay: 2000,
+      keyframeURL: `${this.#URL}/keyframe`,
+      streamURL: process.env.WORKER_STREAM == 1 ? `${this.#URL}/stream` : null,
+    });
     this.#logger = Logger({ name: `${this.title}-simulation-controller` });
   }
 
@@ -10,6 +10,8 @@ export class WorkerController {
   title;
   isWorkerRunning;
   #URL;
+  #keyframeURL;
+  #streamURL;
   #runFilePath;
   #worker;
   #fetchDelay;
@@ -18,13 +20,17 @@ export class WorkerController {
   /**
    * @param {string} title Title of the worker
    * @param {string} URL Address that will be fetched by the worker
-   * @param {{fetchDelay: number}} workerOptions Additional worker options, e.g. `fetchDelay` in milliseconds (default `2000`)
+   * @param {{fetchDelay: number, keyframeURL: string, streamURL: string}} workerOptions Additional worker options, e.g. `fetchDelay` in milliseconds (default `2000`),
+   * `keyframeURL` to request a keyframe from when a delta encoded frame was missed
+   * or `streamURL` to receive pushed frames from (Server-Sent Events) instead of fetching `URL` in a loop
    */
   // eslint-disable-next-line unicorn/no-object-as-default-parameter
   constructor(title, URL, workerOptions = { fetchDelay: 2000 }) {
     this.title = title;
     this.isWorkerRunning = false;
     this.#URL = URL;
+    this.#keyframeURL = workerOptions.keyframeURL ?? null;
+    this.#streamURL = workerOptions.streamURL ?? null;
     this.#runFilePath = path.resolve(process.env.WORKER_RUN_FILE_PATH || '../worker/main.js');
     this.#worker = null;
     this.#fetchDelay = Number(process.env.WORKER_DELAY) ?? workerOptions.fetchDelay ?? 2000;
@@ -57,6 +63,8 @@ export class WorkerController {
       workerData: {
         workerName: this.title,
         URL: this.#URL,
+        keyframeURL: this.#keyframeURL,
+        streamURL: this.#streamURL,
         fetchDelay: this.#fetchDelay,
       },
     });
@@ -85,6 +93,8 @@ export class WorkerController {
     return {
       ...this,
       URL: this.#URL,
+      keyframeURL: this.#keyframeURL,
+      streamURL: this.#streamURL,
       runFilePath: this.#runFilePath,
       fetchDelay: this.#fetchDelay,
     };
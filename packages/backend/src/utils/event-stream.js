@@ -0,0 +1,35 @@
+/**
+ * Reads a Server-Sent Events stream (e.g. the body of a fetch response)
+ * and yields every received event as `{ id, event, data }`. Comment lines (keepalives) are skipped.
+ * @param {AsyncIterable<Uint8Array>} body Stream of UTF-8 encoded chunks
+ */
+export async function* readEventStream(body) {
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  for await (const chunk of body) {
+    buffer += decoder.decode(chunk, { stream: true }).replaceAll('\r\n', '\n');
+
+    let boundary = buffer.indexOf('\n\n');
+    while (boundary !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf('\n\n');
+
+      const message = { id: null, event: 'message', data: [] };
+      for (const line of block.split('\n')) {
+        if (line === '' || line.startsWith(':')) continue;
+        const separatorIndex = line.indexOf(':');
+        const field = separatorIndex === -1 ? line : line.slice(0, separatorIndex);
+        const value = separatorIndex === -1 ? '' : line.slice(separatorIndex + 1).replace(/^ /, '');
+        if (field === 'data') message.data.push(value);
+        if (field === 'id') message.id = value;
+        if (field === 'event') message.event = value;
+      }
+
+      if (message.data.length > 0) {
+        yield { ...message, data: message.data.join('\n') };
+      }
+    }
+  }
+}
@@ -0,0 +1,27 @@
+import { readEventStream } from './event-stream.js';
+
+const toChunks = async function* (...texts) {
+  const encoder = new TextEncoder();
+  for (const text of texts) yield encoder.encode(text);
+};
+
+const collect = async iterable => {
+  const items = [];
+  for await (const item of iterable) items.push(item);
+  return items;
+};
+
+describe('readEventStream', () => {
+  it('yields events split across chunks', async () => {
+    const events = await collect(readEventStream(toChunks('id: 1\ndata: {"a"', ':1}\n\nid: 2\ndata: {}\n\n')));
+    expect(events).toEqual([
+      { id: '1', event: 'message', data: '{"a":1}' },
+      { id: '2', event: 'message', data: '{}' },
+    ]);
+  });
+
+  it('skips keepalive comments and joins multi-line data', async () => {
+    const events = await collect(readEventStream(toChunks(': keepalive\n\n', 'event: dynamic\ndata: a\ndata: b\n\n')));
+    expect(events).toEqual([{ id: null, event: 'dynamic', data: 'a\nb' }]);
+  });
+});
@@ -0,0 +1,43 @@
+/**
+ * Creates a function that reassembles full dynamic data from the delta encoded frames of a Python sim.
+ * Frames without a sequence number (full frames, or frames of a fast-forward without visualization)
+ * are passed through unchanged.
+ * A missing sequence number or a delta without a preceding keyframe sets `needsKeyframe` (once per gap),
+ * delta frames are then dropped until the next keyframe arrives.
+ */
+export const createFrameAssembler = () => {
+  let lastSequence = null;
+  let lastFrame = null;
+  let isKeyframeRequested = false;
+
+  return payload => {
+    if (payload.sequence === undefined) {
+      return { frame: payload, needsKeyframe: false };
+    }
+
+    const isInSequence = lastSequence !== null && payload.sequence === lastSequence + 1;
+    lastSequence = payload.sequence;
+
+    if (payload.keyframe) {
+      lastFrame = payload;
+      isKeyframeRequested = false;
+      return { frame: lastFrame, needsKeyframe: false };
+    }
+
+    if (!lastFrame || !isInSequence) {
+      lastFrame = null;
+      const needsKeyframe = !isKeyframeRequested;
+      isKeyframeRequested = true;
+      return { frame: null, needsKeyframe };
+    }
+
+    const { config } = lastFrame.visualization;
+    for (const [siteIndex, species] of payload.visualization.changes) {
+      config[siteIndex] = species;
+    }
+    const plotData = [...lastFrame.plots.plotData, ...payload.plots.plotData].slice(-payload.historyLength);
+
+    lastFrame = { ...payload, visualization: { config }, plots: { plotData } };
+    return { frame: lastFrame, needsKeyframe: false };
+  };
+};
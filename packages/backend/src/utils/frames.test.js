@@ -0,0 +1,58 @@
+import { createFrameAssembler } from './frames.js';
+
+const keyframe = sequence => ({
+  sequence,
+  keyframe: true,
+  historyLength: 2,
+  visualization: { config: [0, 0, 0, 0] },
+  plots: { plotData: [{ kmcTime: 1 }, { kmcTime: 2 }] },
+});
+
+const delta = (sequence, changes, kmcTime) => ({
+  sequence,
+  keyframe: false,
+  historyLength: 2,
+  visualization: { changes },
+  plots: { plotData: [{ kmcTime }] },
+});
+
+describe('createFrameAssembler', () => {
+  it('passes through full frames without sequence number', () => {
+    const assembleFrame = createFrameAssembler();
+    const payload = { visualization: { config: [1, 2] }, plots: { plotData: [] } };
+    expect(assembleFrame(payload)).toEqual({ frame: payload, needsKeyframe: false });
+  });
+
+  it('passes through fast-forward frames without visualization', () => {
+    const assembleFrame = createFrameAssembler();
+    assembleFrame(keyframe(1));
+    const payload = { plots: { plotData: [{ kmcTime: 2 }] }, fastForward: { active: true } };
+
+    expect(assembleFrame(payload)).toEqual({ frame: payload, needsKeyframe: false });
+    expect(assembleFrame(delta(2, [], 3)).needsKeyframe).toBe(false);
+  });
+
+  it('applies changes and the newest plot entry to the last keyframe', () => {
+    const assembleFrame = createFrameAssembler();
+    assembleFrame(keyframe(1));
+    const { frame, needsKeyframe } = assembleFrame(delta(2, [[1, 3]], 3));
+
+    expect(needsKeyframe).toBe(false);
+    expect(frame.visualization.config).toEqual([0, 3, 0, 0]);
+    expect(frame.plots.plotData).toEqual([{ kmcTime: 2 }, { kmcTime: 3 }]);
+  });
+
+  it('requests a keyframe once on a sequence gap and drops deltas until it arrives', () => {
+    const assembleFrame = createFrameAssembler();
+    assembleFrame(keyframe(1));
+
+    expect(assembleFrame(delta(3, [[0, 1]], 3))).toEqual({ frame: null, needsKeyframe: true });
+    expect(assembleFrame(delta(4, [[0, 1]], 4))).toEqual({ frame: null, needsKeyframe: false });
+    expect(assembleFrame(keyframe(5)).frame.visualization.config).toEqual([0, 0, 0, 0]);
+  });
+
+  it('requests a keyframe when the first frame is a delta', () => {
+    const assembleFrame = createFrameAssembler();
+    expect(assembleFrame(delta(7, [], 1))).toEqual({ frame: null, needsKeyframe: true });
+  });
+});
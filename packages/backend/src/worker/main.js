@@ -1,32 +1,57 @@
 import { parentPort, workerData } from 'node:worker_threads';
 import { Logger } from '../utils/logger.js';
 import { delayFor } from '../utils/delay.js';
+import { createFrameAssembler } from '../utils/frames.js';
+import { readEventStream } from '../utils/event-stream.js';
 
-const { workerName, URL, fetchDelay } = workerData;
+const { workerName, URL, keyframeURL, streamURL, fetchDelay } = workerData;
 const logger = Logger({ name: workerName });
+const assembleFrame = createFrameAssembler();
 
-const main = async () => {
-  if (!URL || `${URL}` === '') {
-    const message = `Target URL is missing`;
-    logger.error(message);
-    throw new Error(message, { url: URL });
+const requestKeyframe = async () => {
+  if (!keyframeURL) return;
+
+  try {
+    await fetch(keyframeURL, { method: 'POST' });
+  } catch (error) {
+    logger.warn('Requesting keyframe from target failed', error);
   }
+};
+
+const handlePayload = async payload => {
+  const { frame, needsKeyframe } = assembleFrame(payload);
+
+  if (needsKeyframe) {
+    logger.warn(`Missed delta frame (sequence: ${payload.sequence}), requesting keyframe...`);
+    await requestKeyframe();
+  }
+  if (frame) {
+    parentPort.postMessage(frame);
+  }
+};
 
+const pollFrames = async () => {
   logger.info(`Starting ${workerName} worker loop to fetch URL '${URL}' every ${fetchDelay} milliseconds...`);
 
-  parentPort.on('message', value => {
-    if (value === 'shutdown') {
-      logger.info(`Received shutdown message from main thread. Shutting down ${workerName} worker...`);
-      process.exit(0);
-    }
-  });
+  // id of the last received frame, the simulation server answers with the frame after it
+  let frameId = null;
 
   // eslint-disable-next-line no-constant-condition
   while (true) {
     try {
-      const response = await fetch(URL);
+      const response = await fetch(frameId ? `${URL}?after=${frameId}` : URL);
+
+      // e.g. 504 when no frame arrived in time, its body `{ success: false }` is not a frame
+      if (!response.ok) {
+        logger.warn(`Target URL returned unsuccessfully (code: ${response.status}), retrying...`);
+        await response.body?.cancel();
+        await delayFor(fetchDelay ?? 0, logger);
+        continue;
+      }
+
+      frameId = response.headers.get('X-Frame-Id') ?? frameId;
       const payload = await response.json();
-      parentPort.postMessage(payload);
+      await handlePayload(payload);
 
       logger.debug('Fetched data from target URL', { data: { workerName, URL, fetchDelay, payload } });
 
@@ -39,4 +64,45 @@ const main = async () => {
   }
 };
 
+const streamFrames = async () => {
+  logger.info(`Starting ${workerName} worker to receive pushed frames from URL '${streamURL}'...`);
+
+  try {
+    const response = await fetch(streamURL, { headers: { Accept: 'text/event-stream' } });
+
+    if (!response.ok) {
+      throw new Error(`Stream request returned unsuccessfully (code: ${response.status})`);
+    }
+
+    for await (const { data } of readEventStream(response.body)) {
+      await handlePayload(JSON.parse(data));
+    }
+  } catch (error) {
+    const message = 'Worker failed receiving streamed data or sending it to parent process';
+    logger.error(message, error);
+    throw new Error(message, error);
+  }
+
+  const message = 'Stream of target URL has ended';
+  logger.error(message);
+  throw new Error(message);
+};
+
+const main = async () => {
+  if (!URL || `${URL}` === '') {
+    const message = `Target URL is missing`;
+    logger.error(message);
+    throw new Error(message, { url: URL });
+  }
+
+  parentPort.on('message', value => {
+    if (value === 'shutdown') {
+      logger.info(`Received shutdown message from main thread. Shutting down ${workerName} worker...`);
+      process.exit(0);
+    }
+  });
+
+  await (streamURL ? streamFrames() : pollFrames());
+};
+
 await main();
@@ -205,7 +205,8 @@ export class SimulationPageController {
    */
   renderDynamicData(jsonData) {
     if (!this.#isPaused) {
-      this.#visualizationController.renderDynamicData(jsonData.visualization.config);
+      // frames of a fast-forward have no visualization, the lattice is only sent at its end
+      if (jsonData.visualization) this.#visualizationController.renderDynamicData(jsonData.visualization.config);
       this.#plotController.updatePlots(jsonData.plots);
       if (!this.#isModeratorUpdated) this.#updateModSlider(jsonData.sliderData);
       if (!this.#isModerator) this.#sliderController.updateSliderValues(jsonData.sliderData);
@@ -0,0 +1,56 @@
+"""
+KMC time per wall-clock second and TOFs with and without the temporal
+acceleration of kmcos (do_acc_steps), from the same steady state. The
+accelerated run needs a model compiled with SIMULATION_ACCELERATION=1
+(kmcos --temp_acc), with other models it is skipped.
+"""
+
+import time
+import numpy as np
+import pytest
+
+from kmcos.run import base, get_tof_names
+
+STEPS = int(5e5)
+SIZE = 20
+# steps from the empty lattice to the steady state at the default parameters
+STEADY_STATE_STEPS = int(2e6)
+# the defaults of kmcos (buffer 1000, 200 executions) hardly ever scale the diffusion
+# processes of the Methanation model down
+ACCELERATION = dict(buffer_parameter=10, execution_steps=20, sampling_steps=20)
+
+
+@pytest.fixture(scope='module')
+def tofs():
+    """TOFs of the runs of this module by accelerate."""
+    return {}
+
+
+@pytest.mark.parametrize('accelerate', [False, True], ids=['plain', 'accelerated'])
+def test_acceleration(benchmark, create_model, tofs, accelerate):
+    model = create_model(SIZE, steps=STEADY_STATE_STEPS, accelerate=accelerate,
+                         **ACCELERATION)
+    if accelerate and not model.accelerate:
+        pytest.skip('model not compiled with temporal acceleration')
+    # the TOFs of get_atoms are averaged since its previous call
+    model.get_atoms(geometry=False)
+    kmc_time = base.get_kmc_time()
+    # timed here as well, benchmark.stats is None with --benchmark-disable
+    seconds = []
+
+    def do_steps():
+        start = time.perf_counter()
+        model.do_frame_steps(STEPS)
+        seconds.append(time.perf_counter() - start)
+
+    benchmark.pedantic(do_steps, rounds=10)
+    tof = model.get_atoms(geometry=False).tof_data
+    tofs[accelerate] = tof
+    benchmark.extra_info['kmc_time_per_second'] = (base.get_kmc_time() - kmc_time) / sum(seconds)
+    for name, value in zip(get_tof_names(), tof):
+        benchmark.extra_info[f'tof_{name}'] = float(value)
+    if accelerate and False in tofs:
+        # relative deviation of the TOFs from the ones without acceleration
+        deviation = np.abs(tof - tofs[False]) / np.maximum(np.abs(tofs[False]), 1e-300)
+        for name, value in zip(get_tof_names(), deviation):
+            benchmark.extra_info[f'tof_deviation_{name}'] = float(value)
@@ -0,0 +1,40 @@
+"""Frame build and serialization time (full and level of detail frames) against the lattice size."""
+
+import pytest
+
+from start import FRAME_ENCODERS, get_frame_view
+
+SIZES = [10, 20, 50, 100]
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_single_dynamic_data(benchmark, create_model, size):
+    model = create_model(size)
+    benchmark.extra_info['sites'] = size * size * int(model.lattice.spuck)
+    benchmark(model._get_single_dynamic_data)
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_dynamic_data(benchmark, create_model, size):
+    model = create_model(size)
+    benchmark.extra_info['sites'] = size * size * int(model.lattice.spuck)
+    benchmark(model._get_dynamic_data)
+
+
+@pytest.mark.parametrize('mimetype', sorted(FRAME_ENCODERS))
+@pytest.mark.parametrize('size', SIZES)
+def test_encode_frame(benchmark, create_model, size, mimetype):
+    model = create_model(size)
+    frame = model._get_dynamic_data()
+    benchmark.extra_info['bytes'] = len(FRAME_ENCODERS[mimetype](frame))
+    benchmark(FRAME_ENCODERS[mimetype], frame)
+
+
+@pytest.mark.parametrize('args', [{'window': '0,0,10,10'}, {'cell': '10'}], ids=['window', 'cell'])
+@pytest.mark.parametrize('size', [50, 100])
+def test_frame_view(benchmark, create_model, size, args):
+    model = create_model(size)
+    frame = model._get_dynamic_data()
+    encoder = get_frame_view(model, args).encoder(FRAME_ENCODERS['application/json'])
+    benchmark.extra_info['bytes'] = len(encoder(frame))
+    benchmark(encoder, frame)
@@ -0,0 +1,81 @@
+"""
+End-to-end /dynamic latency (wait for a frame newer than the last one of the
+client and serialize it) with concurrent clients, through the Flask test client
+of the app of start.py with a running simulation process, with frames passed on
+the image queue and in shared memory.
+"""
+
+import os
+import threading
+import time
+import numpy as np
+import pytest
+
+from start import create_app
+
+REQUESTS_PER_CLIENT = 10
+
+
+@pytest.fixture(scope='module', params=['queue', 'shared_memory'])
+def app(request):
+    shared_memory = os.environ.get('SIMULATION_SHARED_MEMORY')
+    os.environ['SIMULATION_SHARED_MEMORY'] = '1' if request.param == 'shared_memory' else '0'
+    try:
+        app = create_app()
+    finally:
+        if shared_memory is None:
+            del os.environ['SIMULATION_SHARED_MEMORY']
+        else:
+            os.environ['SIMULATION_SHARED_MEMORY'] = shared_memory
+    assert app.test_client().post('/start').status_code == 201
+    yield app
+    app.kmc_model.kill()
+    app.kmc_model.join()
+    app.frames.close()
+    app.kmc_model.deallocate()
+
+
+def get_dynamic(app, latencies):
+    client = app.test_client()
+    frame_id = 0
+    for _ in range(REQUESTS_PER_CLIENT):
+        start = time.perf_counter()
+        response = client.get('/dynamic', query_string={'after': frame_id})
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200
+        assert int(response.headers['X-Frame-Id']) > frame_id
+        frame_id = int(response.headers['X-Frame-Id'])
+
+
+@pytest.mark.parametrize('clients', [1, 4, 16])
+def test_dynamic_latency(benchmark, app, clients):
+    latencies = []
+    runs = []
+
+    def run():
+        runs.append(clients)
+        threads = [threading.Thread(target=get_dynamic, args=(app, latencies))
+                   for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    benchmark.pedantic(run, rounds=3, warmup_rounds=1)
+    assert len(latencies) == len(runs) * clients * REQUESTS_PER_CLIENT
+    for percentile in (50, 95, 99):
+        benchmark.extra_info[f'p{percentile}_seconds'] = float(np.percentile(latencies, percentile))
+
+
+def test_history(app):
+    """The plot history grows with the frames of the simulation, whichever way they are passed."""
+    def history_end(client):
+        history = client.get('/history').get_json()
+        return history['sequence'] + len(history['kmcTime'])
+
+    client = app.test_client()
+    frame_id = int(client.get('/dynamic').headers['X-Frame-Id'])
+    end = history_end(client)
+    for _ in range(3):
+        frame_id = int(client.get('/dynamic', query_string={'after': frame_id}).headers['X-Frame-Id'])
+    assert history_end(client) >= end + 3
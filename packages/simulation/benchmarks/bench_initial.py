@@ -0,0 +1,23 @@
+"""Build time of the initial data (served by /initial) against the lattice size."""
+
+import pytest
+
+SIZES = [10, 20, 50]
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_initial_data(benchmark, create_model, size):
+    model = create_model(size)
+    benchmark(model._get_initial_data)
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_sites(benchmark, create_model, size):
+    model = create_model(size)
+    benchmark(model._get_sites)
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_fixed_species(benchmark, create_model, size):
+    model = create_model(size)
+    benchmark(model._get_fixed_species)
@@ -0,0 +1,32 @@
+"""
+KMC step throughput (do_steps) at some points of the adjustable parameters.
+With the stub model the step cost does not depend on the parameters.
+"""
+
+import pytest
+
+import kmc_settings as settings
+from kmcos.run import set_rate_constants
+
+STEPS = int(1e5)
+SIZE = 20
+# (T, E_C, E_O): default, cold and hot corners of the slider ranges
+POINTS = [(523.0, 1.40, -1.05), (400.0, 0.5, -1.5), (800.0, 2.5, 0.5)]
+
+
+@pytest.mark.parametrize('T, E_C, E_O', POINTS)
+def test_do_steps(benchmark, create_model, T, E_C, E_O):
+    model = create_model(SIZE)
+    defaults = {name: settings.parameters[name]['value'] for name in ('T', 'E_C', 'E_O')}
+    for name, value in zip(('T', 'E_C', 'E_O'), (T, E_C, E_O)):
+        settings.parameters[name]['value'] = str(value)
+    set_rate_constants(settings.parameters, False, model.can_accelerate)
+    try:
+        benchmark.pedantic(model.do_steps, args=(STEPS,), rounds=10, warmup_rounds=1)
+        if benchmark.enabled:
+            # no stats with --benchmark-disable
+            benchmark.extra_info['steps_per_second'] = STEPS / benchmark.stats.stats.median
+    finally:
+        for name, value in defaults.items():
+            settings.parameters[name]['value'] = value
+        set_rate_constants(settings.parameters, False, model.can_accelerate)
@@ -0,0 +1,60 @@
+"""
+pytest-benchmark setup of the simulation service benchmarks.
+
+Run from inside the compiled model directory (e.g. Methanation_local_smart)
+they use the compiled model, from anywhere else the stub model of stub_model.
+"""
+
+import glob
+import os
+import sys
+import pytest
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+SIMULATION_DIR = os.path.dirname(BENCHMARKS_DIR)
+STUB_MODEL_DIR = os.path.join(BENCHMARKS_DIR, 'stub_model')
+
+
+def pytest_addoption(parser):
+    parser.addoption('--stub-model', action='store_true',
+                     help='use the stub model even if a compiled model is in the current directory')
+
+
+def pytest_configure(config):
+    compiled = (os.path.exists('kmc_settings.py') and
+                glob.glob('kmc_model*.so') + glob.glob('kmc_model*.pyd'))
+    model_dir = os.getcwd() if compiled and not config.getoption('stub_model') else STUB_MODEL_DIR
+    sys.path[:0] = [model_dir, SIMULATION_DIR]
+
+
+def pytest_report_header(config):
+    import kmc_model
+    return f'kmc_model: {kmc_model.__file__}'
+
+
+def pytest_benchmark_update_machine_info(config, machine_info):
+    import kmc_model
+    machine_info['kmc_model'] = os.path.basename(kmc_model.__file__)
+
+
+@pytest.fixture(scope='module')
+def create_model():
+    """
+    Return a function creating a WebGLInterface of the given lattice size (and
+    WebGLInterface options) after `steps` KMC steps. The Fortran lattice is global,
+    so creating a model deallocates the previous one.
+    """
+    from start import WebGLInterface
+    models = []
+
+    def create(size, steps=int(1e5), **options):
+        while models:
+            models.pop().deallocate()
+        model = WebGLInterface(size=[size, size], banner=False, **options)
+        models.append(model)
+        model.do_steps(steps)
+        return model
+
+    yield create
+    while models:
+        models.pop().deallocate()
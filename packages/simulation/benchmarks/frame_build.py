@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark of the frame build time against the lattice size.
+
+Has to be run from inside the compiled model directory
+(e.g. Methanation_local_smart), since it imports kmc_model and kmc_settings.
+"""
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.getcwd())
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from start import WebGLInterface
+
+
+def get_lattice_species_per_site(model):
+    """Previous implementation: one Fortran call per site."""
+    config = []
+    for x_coord in range(model.lattice.system_size[0]):
+        for y_coord in range(model.lattice.system_size[1]):
+            for z_coord in range(model.lattice.system_size[2]):
+                for sites_per_unit_cell in range(1, 1 + model.lattice.spuck):
+                    config.append(
+                        model.lattice.get_species(
+                            [x_coord, y_coord, z_coord, sites_per_unit_cell]))
+    return config
+
+
+def time_call(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return np.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 25, 50, 100, 200])
+    parser.add_argument('--steps', type=int, default=int(1e5),
+                        help='KMC steps to run before timing, to fill the lattice')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print('%10s %8s %14s %14s %14s %8s' % ('size', 'sites', 'per-site [ms]', 'bulk [ms]',
+                                         'frame [ms]', 'speedup'))
+    for size in args.sizes:
+        model = WebGLInterface(size=[size, size], banner=False)
+        model.do_steps(args.steps)
+        if model._get_lattice_species().tolist() != get_lattice_species_per_site(model):
+            raise RuntimeError('Bulk lattice snapshot differs from per-site snapshot.')
+        per_site = time_call(lambda: get_lattice_species_per_site(model), args.repeat)
+        bulk = time_call(lambda: model._get_lattice_species().tolist(), args.repeat)
+        frame = time_call(model._get_single_dynamic_data, args.repeat)
+        sites = size * size * int(model.lattice.spuck)
+        print('%10s %8d %14.3f %14.3f %14.3f %7.1fx' % ('%dx%d' % (size, size), sites,
+                                                      per_site*1e3, bulk*1e3, frame*1e3,
+                                                      per_site/bulk))
+        model.deallocate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+"""
+Startup profile of the simulation service: the import time of start.py broken
+down by the modules it imports (python3 -X importtime), and the wall-clock
+seconds of the model initialization phases.
+
+Has to be run from inside the compiled model directory
+(e.g. Methanation_local_smart), since it imports kmc_model and kmc_settings.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+SIMULATION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def profile_imports():
+    """Return the total import time of start.py and the cumulative seconds of its direct imports."""
+    code = f'import sys; sys.path[:0] = [{os.getcwd()!r}, {SIMULATION_DIR!r}]; import start'
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            capture_output=True, text=True, check=True)
+    total, imports = 0.0, {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        level = (len(name) - len(name.lstrip())) // 2
+        if name.strip() == 'start':
+            total = int(cumulative) / 1e6
+        elif level == 1:
+            imports[name.strip()] = imports.get(name.strip(), 0.0) + int(cumulative) / 1e6
+    return total, imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--top', type=int, default=10, help='imports to list')
+    parser.add_argument('--cache-dir', default=None,
+                        help='initial data cache directory (default: none)')
+    args = parser.parse_args()
+
+    total, imports = profile_imports()
+    print(f'import start: {total:.3f} s')
+    for name, seconds in sorted(imports.items(), key=lambda item: -item[1])[:args.top]:
+        print(f'  {name:30s} {seconds:.3f} s')
+
+    sys.path[:0] = [os.getcwd(), SIMULATION_DIR]
+    from start import WebGLInterface
+
+    start = time.perf_counter()
+    model = WebGLInterface(initial_cache_dir=args.cache_dir, banner=False)
+    print(f'WebGLInterface: {time.perf_counter() - start:.3f} s')
+    for phase, seconds in model.init_phases.items():
+        print(f'  {phase:30s} {seconds:.3f} s')
+
+
+if __name__ == "__main__":
+    main()
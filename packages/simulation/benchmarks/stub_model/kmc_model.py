@@ -0,0 +1,204 @@
+"""
+Pure Python stand-in for the compiled kmc_model extension (base, lattice and
+proclist of the local_smart backend), so the benchmarks run without compiling
+the Fortran model.
+
+The lattice, the process constants and the clocks behave like the compiled
+model, the kinetics do not: every step executes a process chosen by its rate
+constant alone (process availability is not tracked) and writes the species of
+that process to a random site of its site type.
+"""
+
+import numpy as np
+
+import kmc_settings as settings
+
+SPECIES = sorted(settings.representations)
+PROCESSES = sorted(settings.rate_constants)
+SITE_NAMES = [name.lower() for name in settings.site_names]
+# steps drawn at once by do_kmc_steps
+CHUNK_SIZE = 2 ** 20
+
+
+class Base:
+    null_species = -1
+
+    def __init__(self):
+        self._allocated = False
+        self._species = np.zeros(0, dtype=np.int32)
+        self._rates = np.zeros(len(PROCESSES))
+        self._procstat = np.zeros(len(PROCESSES), dtype=np.int64)
+        self._integ_rates = np.zeros(len(PROCESSES))
+        self._accum_rate = 0.0
+        self._kmc_time = 0.0
+        self._kmc_step = 0
+
+    def allocate_system(self, nr_of_proc, volume, system_name):
+        self._species = np.full(volume, SPECIES.index('empty'), dtype=np.int32)
+        self._procstat = np.zeros(nr_of_proc, dtype=np.int64)
+        self._integ_rates = np.zeros(nr_of_proc)
+        self._kmc_time = 0.0
+        self._kmc_step = 0
+        self._allocated = True
+
+    def deallocate_system(self):
+        self._species = np.zeros(0, dtype=np.int32)
+        self._allocated = False
+
+    def is_allocated(self):
+        return self._allocated
+
+    def get_null_species(self):
+        return self.null_species
+
+    def get_species(self, site):
+        return int(self._species[site - 1])
+
+    def replace_species(self, site, old_species, new_species):
+        if self._species[site - 1] != old_species:
+            raise ValueError(f'Site {site} holds species {self._species[site - 1]}, '
+                             f'not {old_species}')
+        self._species[site - 1] = new_species
+
+    def get_kmc_time(self):
+        return self._kmc_time
+
+    def set_kmc_time(self, kmc_time):
+        self._kmc_time = float(kmc_time)
+
+    def get_kmc_step(self):
+        return self._kmc_step
+
+    def set_kmc_step(self, kmc_step):
+        self._kmc_step = int(kmc_step)
+
+    def get_procstat(self, proc):
+        return int(self._procstat[proc - 1])
+
+    def set_rate_const(self, proc, rate):
+        self._rates[proc - 1] = rate
+
+    def get_rate(self, proc):
+        return float(self._rates[proc - 1])
+
+    def get_integ_rate(self, proc):
+        return float(self._integ_rates[proc - 1])
+
+    def get_accum_rate(self, proc=None):
+        return self._accum_rate
+
+    def update_accum_rate(self):
+        self._accum_rate = float(self._rates.sum())
+
+    def update_integ_rate(self):
+        pass
+
+
+class Lattice:
+    model_dimension = 2
+    default_layer = 0
+    substrate_layer = 0
+    nr_of_layers = 1
+    rh211 = 0
+    rh211_s, rh211_t, rh211_f = 1, 2, 3
+    spuck = len(SITE_NAMES)
+    site_positions = np.array([[0.121, 0.5, 0.6], [0.5, 0.0, 0.545], [0.774, 0.5, 0.53]])
+    unit_cell_size = np.diag([6.582, 2.686, 20.0])
+
+    def __init__(self):
+        self.system_size = np.zeros(3, dtype=np.int32)
+
+    def calculate_lattice2nr(self, site):
+        x, y, z, n = (int(i) for i in site)
+        size_x, size_y, _ = (int(i) for i in self.system_size)
+        return n + self.spuck * (x + size_x * (y + size_y * z))
+
+    def calculate_nr2lattice(self, nr):
+        size_x, size_y, _ = (int(i) for i in self.system_size)
+        cell, n = divmod(nr - 1, self.spuck)
+        return [cell % size_x, cell // size_x % size_y, cell // (size_x * size_y), n + 1]
+
+    def get_species(self, site):
+        return base.get_species(self.calculate_lattice2nr(site))
+
+    def replace_species(self, site, old_species, new_species):
+        base.replace_species(self.calculate_lattice2nr(site), old_species, new_species)
+
+    def deallocate_system(self):
+        base.deallocate_system()
+
+
+class Proclist:
+    nr_of_proc = len(PROCESSES)
+    default_species = SPECIES.index('empty')
+
+    def __init__(self):
+        for nr, species in enumerate(SPECIES):
+            setattr(self, species.lower(), nr)
+        for nr, process in enumerate(PROCESSES, 1):
+            setattr(self, process.lower(), nr)
+        for site_name in SITE_NAMES:
+            setattr(self, 'touchup_' + site_name, self._touchup)
+        # site type and product species of every process
+        self._process_sites = np.arange(self.nr_of_proc) % lattice.spuck
+        self._process_species = np.arange(self.nr_of_proc) % len(SPECIES)
+        self._random = np.random.Generator(np.random.MT19937(1))
+
+    def init(self, input_system_size, system_name, layer=0, seed_in=1, no_banner=False):
+        size = list(input_system_size) + [1] * (3 - len(input_system_size))
+        lattice.system_size = np.array(size, dtype=np.int32)
+        base.allocate_system(self.nr_of_proc, int(np.prod(size)) * lattice.spuck, system_name)
+        self._random = np.random.Generator(np.random.MT19937(int(seed_in)))
+
+    def get_seed(self):
+        state = self._random.bit_generator.state['state']
+        return np.append(state['key'], state['pos']).astype(np.int64)
+
+    def put_seed(self, seed_state):
+        seed_state = np.asarray(seed_state)
+        bit_generator = self._random.bit_generator
+        bit_generator.state = {
+            'bit_generator': 'MT19937',
+            'state': {'key': seed_state[:-1].astype(np.uint32), 'pos': int(seed_state[-1])},
+        }
+
+    def _touchup(self, site):
+        pass
+
+    def do_kmc_steps(self, n):
+        n = int(n)
+        total_rate = base._rates.sum()
+        n_cells = len(base._species) // lattice.spuck
+        if not n or total_rate <= 0 or not n_cells:
+            return
+        probabilities = base._rates / total_rate
+        while n > 0:
+            steps = min(n, CHUNK_SIZE)
+            processes = self._random.choice(self.nr_of_proc, size=steps, p=probabilities)
+            sites = (self._random.integers(n_cells, size=steps) * lattice.spuck +
+                     self._process_sites[processes])
+            base._species[sites] = self._process_species[processes]
+            base._procstat += np.bincount(processes, minlength=self.nr_of_proc)
+            time_step = self._random.gamma(steps) / (total_rate * n_cells)
+            base._integ_rates += base._rates * n_cells * time_step
+            base._kmc_time += time_step
+            base._kmc_step += steps
+            n -= steps
+
+    def do_kmc_step(self):
+        self.do_kmc_steps(1)
+
+    def get_occupation(self):
+        n_species = len(SPECIES)
+        species = base._species.reshape(-1, lattice.spuck)
+        occupation = np.zeros((n_species, lattice.spuck))
+        if len(species):
+            for site in range(lattice.spuck):
+                occupation[:, site] = np.bincount(species[:, site], minlength=n_species)
+            occupation /= len(species)
+        return occupation
+
+
+base = Base()
+lattice = Lattice()
+proclist = Proclist()
@@ -0,0 +1,81 @@
+"""
+Settings of the stub model: the sites, species, adjustable parameters and TOFs
+of the Methanation model, with a reduced set of processes.
+"""
+
+model_name = 'Methanation'
+simulation_size = 20
+random_seed = 1
+
+# Default history length in graph
+hist_length = 30
+
+parameters = {
+    "A":{"value":"6.582*2.686*angstrom**2", "adjustable":False, "min":"0.0", "max":"0.0","scale":"linear"},
+    "E_C":{"value":"1.40", "adjustable":True, "min":"0.0", "max":"3.4","scale":"linear"},
+    "E_CH3_t":{"value":"(0.2269400*E_C+0.0000000*E_O+(0.3121100))", "adjustable":False, "min":"0.0", "max":"0.0","scale":"linear"},
+    "E_CO_s":{"value":"(0.3820000*E_C+0.0000000*E_O+(0.2943200))", "adjustable":False, "min":"0.0", "max":"0.0","scale":"linear"},
+    "E_CO_t":{"value":"(0.4036300*E_C+0.0000000*E_O+(0.4840200))", "adjustable":False, "min":"0.0", "max":"0.0","scale":"linear"},
+    "E_C_diff":{"value":"0.48", "adjustable":False, "min":"0.0", "max":"0.0","scale":"linear"},
+    "E_O":{"value":"-1.05", "adjustable":True, "min":"-1.8", "max":"1.4","scale":"linear"},
+    "E_OH_t":{"value":"(0.0000000*E_C+0.5000000*E_O+(0.8000000))", "adjustable":False, "min":"0.0", "max":"0.0","scale":"linear"},
+    "E_O_diff":{"value":"0.52", "adjustable":False, "min":"0.0", "max":"0.0","scale":"linear"},
+    "H_cov":{"value":"0.1", "adjustable":False, "min":"0.0", "max":"0.0","scale":"linear"},
+    "T":{"value":"523.0", "adjustable":True, "min":"400.0", "max":"800.0","scale":"linear"},
+    "p_CH4gas":{"value":"0.01", "adjustable":True, "min":"1e-20", "max":"100.0","scale":"linear"},
+    "p_COgas":{"value":"0.01", "adjustable":True, "min":"1e-10", "max":"100.0","scale":"linear"},
+    "p_H2Ogas":{"value":"0.01", "adjustable":True, "min":"1e-20", "max":"100.0","scale":"linear"},
+    "p_H2gas":{"value":"0.97", "adjustable":True, "min":"1e-10", "max":"100.0","scale":"linear"},
+    }
+
+rate_constants = {
+    "CO_ads_s":("p_COgas*bar*A/2/sqrt(2*pi*umass*28/beta)", True),
+    "CO_ads_t":("p_COgas*bar*A/2/sqrt(2*pi*umass*28/beta)", True),
+    "CO_des_s":("1/(beta*h)*exp(-beta*max(E_CO_s,0)*eV)", True),
+    "CO_des_t":("1/(beta*h)*exp(-beta*max(E_CO_t,0)*eV)", True),
+    "C_diff_f_f_S":("1/(beta*h)*exp(-beta*E_C_diff*eV)", True),
+    "H2O_t_ads":("p_H2Ogas*bar*A/2/sqrt(2*pi*umass*18/beta)", True),
+    "H_CH3_t_react":("H_cov/(beta*h)*exp(-beta*max(E_CH3_t,0)*eV)", True),
+    "H_OH_t_react":("H_cov/(beta*h)*exp(-beta*max(E_OH_t,0)*eV)", True),
+    "O_diff_s_t":("1/(beta*h)*exp(-beta*E_O_diff*eV)", True),
+    "O_diff_t_s":("1/(beta*h)*exp(-beta*E_O_diff*eV)", True),
+    }
+
+site_names = ['Rh211_s', 'Rh211_t', 'Rh211_f']
+representations = {
+    "C":"""Atoms('C')""",
+    "CH":"""Atoms('CH',[[0,0,0],[0,0,1.09]])""",
+    "CH2":"""Atoms('CH2',[[0,0,0],[0,0.7,0.8],[0,-0.7,0.8]])""",
+    "CH3":"""Atoms('CH3',[[0,0,0],[-0.3,0.5,0.8],[-0.3,-0.5,0.8],[0.7,0,0.8]])""",
+    "CO":"""Atoms('CO',[[0,0,0],[0,0,1.2]])""",
+    "O":"""Atoms('O')""",
+    "OH":"""Atoms('OH',[[0,0,0],[0,0,0.96]])""",
+    "empty":"""""",
+    }
+
+lattice_representation = """[Atoms(symbols='Rh3',
+          pbc=np.array([False, False, False]),
+          cell=np.array(      ([6.582, 2.686, 20.0])),
+          scaled_positions=np.array(      [[0.0, 0.0, 0.5388], [0.3334853, 0.5003723, 0.5], [0.6668186, 0.0, 0.4612]]),
+),]"""
+
+species_tags = {
+    "C":"""""",
+    "CH":"""""",
+    "CH2":"""""",
+    "CH3":"""""",
+    "CO":"""""",
+    "O":"""""",
+    "OH":"""""",
+    "empty":"""""",
+    }
+
+tof_count = {
+    "H2O_t_ads":{'H2O_formation': -1},
+    "H_CH3_t_react":{'CH4_formation': 1},
+    "H_OH_t_react":{'H2O_formation': 1},
+    }
+
+xml = """<?xml version="1.0" ?>
+<kmc version="(0, 3)"/>
+"""
@@ -1,4 +1,8 @@
 #!/usr/bin/env python
+import time
+build_start = time.perf_counter()
+import os
+from collections import Counter
 import kmcos
 from kmcos.types import *
 from kmcos.io import *
@@ -257,10 +261,26 @@ for ads in ['OH']:
 ###It's good to simply copy and paste the below lines between model creation files.
 kmc_model.print_statistics()
 kmc_model.backend = 'local_smart' #specifying is optional. 'local_smart' is the default. Currently, the other options are 'lat_int' and 'otf'
-#kmc_model.compile_options = '--temp_acc'
-kmc_model.clear_model() #This line is optional: if you are updating a model, this line will remove the old model files (including compiled files) before exporting the new one. It is convenient to always include this line because then you don't need to 'confirm' removing/overwriting the old model during the compile step.
-kmc_model.save_model()
-kmcos.compile(kmc_model)
+if os.environ.get('SIMULATION_ACCELERATION') == '1':
+    # temporal acceleration scales down the rate constants of fast quasi-equilibrated process
+    # pairs (e.g. the diffusion processes) and needs every process paired with its reverse,
+    # so the irreversible processes get a reverse process with rate 0, which never happens
+    def is_reverse(process, other):
+        return (Counter(process.condition_list) == Counter(other.action_list) and
+                Counter(other.condition_list) == Counter(process.action_list))
+    for process in list(kmc_model.process_list):
+        if not any(is_reverse(process, other) for other in kmc_model.process_list):
+            kmc_model.add_process(name='%s_rev' % process.name,
+                        rate_constant='0',
+                        condition_list=[Condition(coord=action.coord, species=action.species)
+                                        for action in process.action_list],
+                        action_list=[Action(coord=condition.coord, species=condition.species)
+                                     for condition in process.condition_list])
+    kmc_model.compile_options = '--temp_acc'
+#The build step saves and compiles the model (clearing the old model files first) and takes the compiled model from the build cache (SIMULATION_BUILD_CACHE, default .build-cache) if only parameter values or rate constants changed.
+from build_cache import build
+build(kmc_model, os.environ.get('SIMULATION_BUILD_CACHE') or '.build-cache',
+      phases={'definition': time.perf_counter() - build_start})
 
 
 
@@ -0,0 +1,96 @@
+"""
+Build step of a kmcos model with a cache of the compiled model library.
+
+The compiled Fortran model only depends on the species, lattice, processes
+(conditions and actions), backend and compile options of the model. Parameter
+values and rate constant expressions are evaluated at runtime from
+kmc_settings.py. The library is stored in the cache under the hash of the model
+definition without them and reused while it does not change, so after changing
+only parameter values (e.g. in methanation_kmc_adsorbate_scaling_input.txt) the
+sources and kmc_settings.py are exported again, but the model is not compiled.
+"""
+
+import glob
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import xml.etree.ElementTree as ElementTree
+
+import kmcos
+
+# timing.py of the simulation package
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from timing import timed
+
+# attributes of the model XML only written to kmc_settings.py
+SETTINGS_ATTRIBUTES = {
+    'species': ('representation', 'color', 'tags'),
+    'parameter': ('value', 'adjustable', 'min', 'max', 'scale'),
+    'process': ('rate_constant', 'tof_count'),
+}
+
+
+def model_key(kmc_model):
+    """Hash of the definition of the saved kmc_model the compiled library depends on."""
+    root = ElementTree.parse(kmc_model.filename).getroot()
+    settings_attributes = dict(SETTINGS_ATTRIBUTES)
+    if kmc_model.backend == 'otf':
+        # the otf backend compiles the rate constant expressions into the model
+        settings_attributes.pop('process')
+        settings_attributes.pop('parameter')
+    for tag, attributes in settings_attributes.items():
+        for element in root.iter(tag):
+            for attribute in attributes:
+                element.attrib.pop(attribute, None)
+    digest = hashlib.sha256(ElementTree.tostring(root))
+    digest.update(('%s %s %s' % (kmcos.__version__, kmc_model.backend,
+                                 kmc_model.compile_options)).encode())
+    return digest.hexdigest()[:16]
+
+
+def build(kmc_model, cache_dir, phases=None):
+    """
+    Export and compile kmc_model into <model_name>_<backend> like kmcos.compile,
+    with the compiled library of cache_dir if the model definition was compiled
+    before. Print the number of processes and the seconds per build phase.
+    """
+    phases = {} if phases is None else phases
+    model_dir = '%s_%s' % (kmc_model.meta.model_name, kmc_model.backend)
+    with timed(phases, 'save'):
+        # removes the old model files, so the export does not ask to overwrite them
+        kmc_model.clear_model()
+        kmc_model.save_model()
+    key = model_key(kmc_model)
+    cached = os.path.join(cache_dir, key)
+    status = 'cached'
+    if os.path.isdir(cached):
+        with timed(phases, 'export'):
+            kmcos.export('%s -b %s %s --source-only' % (kmc_model.filename, kmc_model.backend,
+                                                       kmc_model.compile_options))
+            shutil.move(os.path.join(model_dir, 'src', 'kmc_settings.py'), model_dir)
+        with timed(phases, 'cache'):
+            for path in glob.glob(os.path.join(cached, 'kmc_model*')):
+                shutil.copy(path, model_dir)
+    else:
+        with timed(phases, 'compile'):
+            kmcos.compile(kmc_model)
+        libraries = glob.glob(os.path.join(model_dir, 'kmc_model*'))
+        status = 'compiled' if libraries else 'failed'
+        if libraries:
+            with timed(phases, 'cache'):
+                os.makedirs(cache_dir, exist_ok=True)
+                tmp = tempfile.mkdtemp(dir=cache_dir)
+                for path in libraries:
+                    shutil.copy(path, tmp)
+                try:
+                    os.rename(tmp, cached)
+                except OSError:
+                    # stored by a concurrent build
+                    shutil.rmtree(tmp)
+
+    print('Model %s: %d processes, %s, build phases: %s' % (
+        key, len(kmc_model.get_processes()), status,
+        ', '.join('%s %.2f s' % phase for phase in phases.items())))
+    return phases
@@ -0,0 +1,175 @@
+"""
+Prometheus metrics in shared memory, updated in the simulation process and
+rendered by the HTTP server (/metrics), and the sampling profiler of /profile.
+"""
+
+import bisect
+import math
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+
+
+# buckets of the duration histograms, in seconds
+TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_sample(value):
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, help):
+        self.help = help
+        self._value = multiprocessing.RawValue('d', 0.0)
+
+    def inc(self, amount=1):
+        self._value.value += amount
+
+    def samples(self):
+        return [('', {}, self._value.value)]
+
+class Gauge:
+    type = 'gauge'
+
+    def __init__(self, help, function=None):
+        self.help = help
+        self._function = function
+        self._value = multiprocessing.RawValue('d', 0.0)
+
+    def set(self, value):
+        self._value.value = value
+
+    def samples(self):
+        return [('', {}, self._function() if self._function else self._value.value)]
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, help, buckets=TIME_BUCKETS):
+        self.help = help
+        self.buckets = tuple(buckets)
+        # observations per bucket (the last one is +Inf), then sum and count
+        self._values = multiprocessing.RawArray('d', len(self.buckets) + 3)
+
+    def observe(self, value):
+        self._values[bisect.bisect_left(self.buckets, value)] += 1
+        self._values[-2] += value
+        self._values[-1] += 1
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self):
+        values = self._values[:]
+        cumulative = np.cumsum(values[:-2])
+        bounds = [repr(float(bound)) for bound in self.buckets] + ['+Inf']
+        return ([('_bucket', {'le': bound}, count) for bound, count in zip(bounds, cumulative)] +
+                [('_sum', {}, values[-2]), ('_count', {}, values[-1])])
+
+class Metrics:
+    """
+    Registry of Prometheus metrics. Their values live in shared memory, so metrics
+    registered before the simulation process is forked are updated there and read
+    by the HTTP server.
+    """
+    def __init__(self):
+        self._metrics = OrderedDict()
+
+    def _register(self, name, labels, factory):
+        key = (name, tuple(sorted(labels.items())))
+        if key not in self._metrics:
+            self._metrics[key] = factory()
+        return self._metrics[key]
+
+    def counter(self, name, help, **labels):
+        return self._register(name, labels, lambda: Counter(help))
+
+    def gauge(self, name, help, function=None, **labels):
+        return self._register(name, labels, lambda: Gauge(help, function))
+
+    def histogram(self, name, help, buckets=TIME_BUCKETS, **labels):
+        return self._register(name, labels, lambda: Histogram(help, buckets))
+
+    def items(self):
+        return self._metrics.items()
+
+def render_metrics(registries):
+    """
+    Return the Prometheus text exposition of the metrics of (labels, Metrics)
+    pairs, the labels are added to every sample of the registry.
+    """
+    families = OrderedDict()
+    for labels, registry in registries:
+        for (name, metric_labels), metric in registry.items():
+            families.setdefault(name, []).append((dict(labels, **dict(metric_labels)), metric))
+    lines = []
+    for name, series in families.items():
+        lines.append(f'# HELP {name} {series[0][1].help}')
+        lines.append(f'# TYPE {name} {series[0][1].type}')
+        for labels, metric in series:
+            for suffix, sample_labels, value in metric.samples():
+                lines.append(f'{name}{suffix}{_format_labels(dict(labels, **sample_labels))} '
+                             f'{_format_sample(value)}')
+    return '\n'.join(lines) + '\n'
+
+class SamplingProfiler:
+    """
+    Samples the Python stacks of the given threads (all others if None) every
+    `interval` seconds. Every sample is weighted with the time since the previous
+    one, time in native code (Fortran steps) goes to the line that called it.
+    """
+    def __init__(self, thread_ids=None, interval=0.005):
+        self.thread_ids = thread_ids
+        self.interval = interval
+
+    @staticmethod
+    def _stack(frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+            frame = frame.f_back
+        return ';'.join(reversed(stack))
+
+    def run(self, seconds):
+        """
+        Sample for `seconds` and return the stacks in collapsed format (one
+        "frame;frame;... milliseconds" line per stack, heaviest first).
+        """
+        own_id = threading.get_ident()
+        weights = {}
+        end = time.perf_counter() + seconds
+        last = time.perf_counter()
+        while last < end:
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (self.thread_ids and thread_id not in self.thread_ids):
+                    continue
+                stack = self._stack(frame)
+                weights[stack] = weights.get(stack, 0.0) + now - last
+            last = now
+        return ''.join(f'{stack} {weight * 1e3:.1f}\n'
+                       for stack, weight in sorted(weights.items(), key=lambda item: -item[1]))
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+"""
+Tabulates the rate constants of all processes on a grid over some parameters
+for the RateTable of rates.py (SIMULATION_RATE_TABLE). Writes the log rates as
+`<output>.npy` and the axes as `<output>.json`. All other parameters keep their
+current values, the table is only used while they are unchanged.
+
+Has to be run from inside the compiled model directory
+(e.g. Methanation_local_smart), since it imports kmc_model and kmc_settings.
+
+Example:
+    python3 ../../rate_table.py --grid E_C=35 --grid E_O=33 --grid T=41 -o rates
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.getcwd())
+sys.path.insert(1, os.path.dirname(os.path.abspath(__file__)))
+
+from rates import RateConstants
+import kmc_settings as settings
+
+# smallest tabulated rate, so zero rates have a finite logarithm
+MIN_RATE = 1e-300
+
+
+def parse_grid(specs):
+    """
+    Return the parameter names, axes and log flags from "NAME=num" (between the
+    min and max of the parameter) or "NAME=start:stop:num" specs. Parameters
+    with log scale get geometrically spaced axes.
+    """
+    names, axes, log_scale = [], [], []
+    for spec in specs:
+        name, _, values = spec.partition('=')
+        if name not in settings.parameters:
+            raise ValueError(f'{name} is not a parameter of the model')
+        parameter = settings.parameters[name]
+        if ':' in values:
+            start, stop, num = values.split(':')
+        else:
+            start, stop, num = parameter['min'], parameter['max'], values
+        log = parameter.get('scale') == 'log'
+        space = np.geomspace if log else np.linspace
+        names.append(name)
+        axes.append(space(float(start), float(stop), int(num)).tolist())
+        log_scale.append(log)
+    return names, axes, log_scale
+
+
+def tabulate(task):
+    """Return the log rates of all grid points with the first axis at the given value."""
+    names, axes, first_value = task
+    parameters = {name: dict(parameter) for name, parameter in settings.parameters.items()}
+    parameters[names[0]]['value'] = str(first_value)
+    rate_constants = RateConstants(parameters, max_cached=1)
+    processes = sorted(settings.rate_constants)
+    log_rates = np.empty(tuple(len(axis) for axis in axes[1:]) + (len(processes),))
+    previous = None
+    for index in np.ndindex(*log_rates.shape[:-1]):
+        point = [axis[i] for axis, i in zip(axes[1:], index)]
+        changed = [name for name, value, old in zip(names[1:], point, previous or [None] * len(point))
+                   if value != old]
+        for name, value in zip(names[1:], point):
+            parameters[name]['value'] = str(value)
+        rates = rate_constants.update(parameters, changed)
+        log_rates[index] = np.log(np.maximum([rates[proc] for proc in processes], MIN_RATE))
+        previous = point
+    return log_rates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--grid', action='append', required=True,
+                        help='NAME=num or NAME=start:stop:num (repeat for more parameters)')
+    parser.add_argument('-o', '--output', default='rates')
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    names, axes, log_scale = parse_grid(args.grid)
+    processes = sorted(settings.rate_constants)
+    shape = tuple(len(axis) for axis in axes) + (len(processes),)
+    print(f'{np.prod(shape[:-1])} grid points, {np.prod(shape) * 8 / 2**20:.1f} MiB')
+
+    table = np.lib.format.open_memmap(args.output + '.npy', mode='w+', dtype=np.float64,
+                                      shape=shape)
+    with multiprocessing.get_context('fork').Pool(args.processes) as pool:
+        tasks = [(names, axes, value) for value in axes[0]]
+        for i, log_rates in enumerate(pool.imap(tabulate, tasks)):
+            table[i] = log_rates
+            print(f'[{i + 1}/{len(axes[0])}] {names[0]}={axes[0][i]:g}')
+    table.flush()
+
+    with open(args.output + '.json', 'w') as meta_file:
+        json.dump({
+            'parameters': names,
+            'axes': axes,
+            'log': log_scale,
+            'fixed': {name: str(parameter['value']) for name, parameter in settings.parameters.items()
+                      if name not in names},
+            'processes': processes,
+        }, meta_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Rate constants of the processes: incremental evaluation of the rate expressions
+of kmc_settings (RateConstants) and tables of them built by rate_table.py
+(RateTable). Shared by start.py and rate_table.py, which must not import
+start.py.
+"""
+
+import itertools
+import json
+import re
+from collections import OrderedDict
+import numpy as np
+from kmcos.run import ProclistProxy, evaluate_rate_expression
+from kmc_model import base
+import kmc_settings as settings
+
+
+class RateConstants:
+    """
+    Incremental evaluation of the rate constant expressions of kmc_settings.
+    An index maps every parameter to the processes whose expression references
+    it (directly or through other parameter expressions), so a change only
+    re-evaluates these processes. The rate constants of every parameter vector
+    are memoized.
+    """
+    NAME = re.compile(r'[A-Za-z_]\w*')
+
+    def __init__(self, parameters, max_cached=4096):
+        self.expressions = {proc: value[0] for proc, value in settings.rate_constants.items()}
+        self.dependents = self._get_dependents(parameters)
+        self.max_cached = max_cached
+        self.rates = {proc: self._evaluate(proc, parameters) for proc in self.expressions}
+        self._cache = OrderedDict([(self._key(parameters), self.rates)])
+        # rate constants set in the model, and the parameters changed since self.rates
+        self.applied = dict(self.rates)
+        self._stale = set()
+
+    @staticmethod
+    def _references(expression, parameters):
+        """
+        Parameters referenced by the expression, including those of the names that
+        kmcos derives from parameters: beta from T, mu_<species> from T and the
+        pressure, GibbsGas_<species> and GibbsAds_<species> from T and the energy,
+        pressure and frequencies of the species.
+        """
+        names = set(RateConstants.NAME.findall(expression))
+        for name in list(names):
+            prefix, _, species = name.partition('_')
+            if name == 'beta':
+                names.add('T')
+            elif prefix in ('mu', 'GibbsGas', 'GibbsAds') and species:
+                names.update(('T', f'p_{species}', f'E_{species}', f'f_{species}'))
+        return names & set(parameters)
+
+    def _get_dependents(self, parameters):
+        references = {name: self._references(str(parameter['value']), parameters)
+                      for name, parameter in parameters.items()}
+        dependents = {}
+        for name in parameters:
+            affected, todo = {name}, [name]
+            while todo:
+                current = todo.pop()
+                for other, names in references.items():
+                    if current in names and other not in affected:
+                        affected.add(other)
+                        todo.append(other)
+            dependents[name] = {proc for proc, expression in self.expressions.items()
+                                if affected & self._references(expression, parameters)}
+        return dependents
+
+    @staticmethod
+    def _key(parameters):
+        return tuple(sorted((name, str(parameter['value'])) for name, parameter in parameters.items()))
+
+    def _evaluate(self, proc, parameters):
+        rate = evaluate_rate_expression(self.expressions[proc], parameters)
+        if rate < 0.:
+            raise UserWarning(f'{self.expressions[proc]} = {rate}: '
+                              'Negative rate-constants do not make sense')
+        return rate
+
+    def mark_changed(self, changed):
+        """Note parameters changed without update, e.g. when a RateTable was used."""
+        self._stale.update(changed)
+
+    def update(self, parameters, changed):
+        """
+        Return the {process: rate} of all processes after the `changed`
+        parameters got their new values in `parameters`.
+        """
+        changed = self._stale.union(changed)
+        self._stale = set()
+        key = self._key(parameters)
+        rates = self._cache.get(key)
+        if rates is None:
+            rates = dict(self.rates)
+            for proc in set().union(*(self.dependents.get(name, ()) for name in changed)):
+                rates[proc] = self._evaluate(proc, parameters)
+            self._cache[key] = rates
+            if len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+        self.rates = rates
+        return rates
+
+    def apply(self, rates):
+        """Set the rate constants of the processes whose rate differs from the applied one."""
+        updates = {proc: rate for proc, rate in rates.items() if rate != self.applied[proc]}
+        # process numbers are in proclist_constants for some backends, the proxy finds them
+        proclist = ProclistProxy()
+        for proc, rate in updates.items():
+            base.set_rate_const(getattr(proclist, proc.lower()), rate)
+        if updates:
+            if hasattr(base, 'update_accum_rate'):
+                base.update_accum_rate()
+            if hasattr(base, 'update_integ_rate'):
+                base.update_integ_rate()
+        self.applied = dict(rates)
+        return updates
+
+
+class RateTable:
+    """
+    Rate constants of all processes tabulated on a grid over some parameters
+    (built by rate_table.py): the log rates as memory-mapped `<path>.npy` and
+    the axes in `<path>.json`. A lookup interpolates the log rates multilinearly,
+    on a log axis for parameters with log scale.
+    """
+    def __init__(self, path):
+        with open(path + '.json') as meta_file:
+            meta = json.load(meta_file)
+        self.path = path
+        self.names = meta['parameters']
+        self.axes = [np.asarray(axis, dtype=np.float64) for axis in meta['axes']]
+        self.log_scale = meta['log']
+        self.fixed = meta['fixed']
+        self.processes = meta['processes']
+        self.log_rates = np.load(path + '.npy', mmap_mode='r')
+        self._coordinates = [np.log(axis) if log else axis
+                             for axis, log in zip(self.axes, self.log_scale)]
+        self._corners = np.array(list(itertools.product((0, 1), repeat=len(self.names))))
+
+    def matches(self, parameters):
+        """True if the table was built for these processes and the other parameter values."""
+        return (sorted(self.processes) == sorted(settings.rate_constants) and
+                all(str(parameters[name]['value']) == value for name, value in self.fixed.items()))
+
+    def lookup(self, parameters):
+        """Return {process: rate} at the parameter values, None outside of the table."""
+        if not all(str(parameters[name]['value']) == value for name, value in self.fixed.items()):
+            return None
+        lower, fraction = [], []
+        for name, coordinates, log in zip(self.names, self._coordinates, self.log_scale):
+            value = float(parameters[name]['value'])
+            if log:
+                if value <= 0:
+                    return None
+                value = np.log(value)
+            if not coordinates[0] <= value <= coordinates[-1]:
+                return None
+            index = min(int(np.searchsorted(coordinates, value, side='right')) - 1,
+                        len(coordinates) - 2)
+            lower.append(index)
+            fraction.append((value - coordinates[index]) /
+                            (coordinates[index + 1] - coordinates[index]))
+        indices = np.asarray(lower) + self._corners
+        fraction = np.asarray(fraction)
+        weights = np.prod(np.where(self._corners, fraction, 1 - fraction), axis=1)
+        log_rates = weights @ self.log_rates[tuple(indices.T)]
+        return dict(zip(self.processes, np.exp(log_rates).tolist()))
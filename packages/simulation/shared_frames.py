@@ -0,0 +1,229 @@
+"""
+Frames in shared memory: the simulation process writes them to a SharedFrameBuffer
+instead of the image queue (SIMULATION_SHARED_MEMORY), the HTTP handlers of the
+server process read them through a SharedFrameReader.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing import shared_memory
+import numpy as np
+
+
+class SharedFrameBuffer:
+    """
+    Ring buffer of fixed-layout frames (kmc_time, species, TOF and occupation
+    arrays) in shared memory. The simulation process writes frames in place,
+    readers build their responses directly from the slot arrays.
+
+    Every slot has a seqlock counter that is odd while the slot is written, so
+    neither side waits for the other: a reader checks the counter before and
+    after using a slot and retries if the slot was (being) overwritten.
+    With stderr the slots also hold the standard errors of the TOFs and occupations.
+    Summary frames (of a fast-forward) leave the species of their slot unwritten.
+    """
+    def __init__(self, n_sites, n_tofs, occupation_shape, slots=64, stderr=False):
+        self.slots = slots
+        fields = [
+            ('count', np.uint64, ()),
+            ('seq', np.uint64, (slots,)),
+            ('kmc_time', np.float64, (slots,)),
+            ('summary', np.uint8, (slots,)),
+            ('tof', np.float64, (slots, n_tofs, 2)),
+            ('occupation', np.float64, (slots,) + tuple(occupation_shape)),
+            ('species', np.uint8, (slots, n_sites)),
+        ]
+        self.tof_stderr = None
+        self.occupation_stderr = None
+        if stderr:
+            fields += [
+                ('tof_stderr', np.float64, (slots, n_tofs, 2)),
+                ('occupation_stderr', np.float64, (slots,) + tuple(occupation_shape)),
+            ]
+        self._fields = [name for name, _, _ in fields]
+        offsets = []
+        size = 0
+        for _, dtype, shape in fields:
+            offsets.append(size)
+            size += -(-int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize // 8) * 8
+        self._shm = shared_memory.SharedMemory(create=True, size=size)
+        self._owner_pid = os.getpid()
+        for (name, dtype, shape), offset in zip(fields, offsets):
+            setattr(self, name, np.ndarray(shape, dtype=dtype, buffer=self._shm.buf, offset=offset))
+        self.count[()] = 0
+        self.seq[:] = 0
+
+    def close(self):
+        if self._shm is None:
+            return
+        for name in self._fields:
+            setattr(self, name, None)
+        self._shm.close()
+        if os.getpid() == self._owner_pid:
+            self._shm.unlink()
+        self._shm = None
+
+    @property
+    def frame_count(self):
+        return int(self.count)
+
+    def write(self, kmc_time, species, tof, occupation, tof_stderr=None, occupation_stderr=None):
+        slot = self.frame_count % self.slots
+        self.seq[slot] += 1
+        self.kmc_time[slot] = kmc_time
+        self.summary[slot] = species is None
+        if species is not None:
+            self.species[slot] = species
+        self.tof[slot] = tof
+        self.occupation[slot] = occupation
+        if self.tof_stderr is not None:
+            self.tof_stderr[slot] = 0.0 if tof_stderr is None else tof_stderr
+            self.occupation_stderr[slot] = 0.0 if occupation_stderr is None else occupation_stderr
+        self.seq[slot] += 1
+        self.count[()] += 1
+
+    def slot(self, frame_number):
+        """Slot index of the (1-based) frame number."""
+        return (frame_number - 1) % self.slots
+
+    def is_valid(self, frame_numbers):
+        """
+        True if all given frames are completely written and not yet overwritten.
+        """
+        frame_numbers = np.asarray(frame_numbers, dtype=np.int64)
+        expected = 2 * ((frame_numbers - 1) // self.slots + 1)
+        return bool(np.all(self.seq[(frame_numbers - 1) % self.slots] == expected.astype(np.uint64)))
+
+class SharedFrameReader:
+    """
+    Frame source of the HTTP handlers when the simulation writes to a SharedFrameBuffer.
+    Same interface as FrameBroadcaster, the frames are built from the buffer slots
+    (plot history from the preceding slots) and validated after encoding. The
+    payloads of the last encoded frames are cached per encoder. Summary frames
+    get the progress of the fast-forward from the fast_forward callable.
+    """
+    def __init__(self, frame_buffer, slider_data, history_length=30, keyframe_interval=None,
+                 poll_interval=0.002, fast_forward=None):
+        self.frame_buffer = frame_buffer
+        self.history_length = min(history_length, frame_buffer.slots - 2)
+        self.keyframe_interval = keyframe_interval
+        self._slider_data = slider_data
+        self._fast_forward = fast_forward
+        self._poll_interval = poll_interval
+        self._history_start = 0
+        self._keyframe_requested = False
+        self._payloads = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self):
+        pass
+
+    def close(self):
+        self.frame_buffer.close()
+
+    @property
+    def frame_id(self):
+        return self.frame_buffer.frame_count
+
+    def clear(self, first_id):
+        """
+        Serve only the frames from first_id on, e.g. the frame of a reset, their plot
+        history starts there as well.
+        """
+        with self._lock:
+            self._history_start = first_id - 1
+            self._payloads.clear()
+
+    def request_keyframe(self):
+        self._keyframe_requested = True
+
+    def _wait_for(self, predicate, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not predicate():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(self._poll_interval)
+        return True
+
+    def _build_frame(self, frame_number):
+        """
+        Return the frame as dict of views on the buffer slots and the frame
+        numbers it was built from.
+        """
+        buffer = self.frame_buffer
+        first = max(self._history_start + 1, frame_number - self.history_length + 1)
+        history = list(range(first, frame_number + 1))
+        frame = {}
+        if buffer.summary[buffer.slot(frame_number)]:
+            # fast-forward frame without the lattice, neither a keyframe nor a delta
+            if self._fast_forward is not None:
+                frame["fastForward"] = self._fast_forward()
+            used = history
+        else:
+            species = buffer.species[buffer.slot(frame_number)]
+            keyframe = True
+            if self.keyframe_interval:
+                # the slot before a summary frame does not hold the previous lattice
+                keyframe = (self._keyframe_requested or frame_number % self.keyframe_interval == 0 or
+                            frame_number - 1 <= self._history_start or
+                            bool(buffer.summary[buffer.slot(frame_number - 1)]))
+                frame.update(sequence=frame_number, keyframe=keyframe,
+                             historyLength=self.history_length)
+            if keyframe:
+                self._keyframe_requested = False
+                frame["visualization"] = {"config": species}
+                used = history
+            else:
+                changed_sites = np.flatnonzero(
+                    species != buffer.species[buffer.slot(frame_number - 1)])
+                frame["visualization"] = {
+                    "changes": np.column_stack((changed_sites, species[changed_sites])).astype(np.int32)
+                }
+                history = history[-1:]
+                used = [frame_number - 1, frame_number]
+        if buffer.tof_stderr is None:
+            frame["plots"] = {"plotData": [{
+                "kmcTime": float(buffer.kmc_time[buffer.slot(n)]),
+                "tof": [{"values": tof} for tof in buffer.tof[buffer.slot(n)]],
+                "coverage": [{"values": occ} for occ in buffer.occupation[buffer.slot(n)]],
+            } for n in history]}
+        else:
+            frame["plots"] = {"plotData": [{
+                "kmcTime": float(buffer.kmc_time[buffer.slot(n)]),
+                "tof": [{"values": tof, "stderr": stderr} for tof, stderr in
+                        zip(buffer.tof[buffer.slot(n)], buffer.tof_stderr[buffer.slot(n)])],
+                "coverage": [{"values": occ, "stderr": stderr} for occ, stderr in
+                             zip(buffer.occupation[buffer.slot(n)],
+                                 buffer.occupation_stderr[buffer.slot(n)])],
+            } for n in history]}
+        frame["sliderData"] = self._slider_data()
+        return frame, used
+
+    def _encode(self, frame_number, encoder, cache_size=8):
+        with self._lock:
+            while (frame_number, encoder) not in self._payloads:
+                frame, numbers = self._build_frame(frame_number)
+                payload = encoder(frame)
+                if self.frame_buffer.is_valid(numbers):
+                    self._payloads[frame_number, encoder] = payload
+                    if len(self._payloads) > cache_size:
+                        self._payloads.popitem(last=False)
+                    break
+                # overwritten while encoding, skip to the newest frame
+                frame_number = self.frame_id
+            return frame_number, self._payloads[frame_number, encoder]
+
+    def get_after(self, encoder, after_id=0, timeout=None):
+        after_id = max(after_id, self._history_start)
+        if not self._wait_for(lambda: self.frame_id > after_id, timeout):
+            return None, None
+        # the oldest frame that cannot be overwritten while it is encoded
+        return self._encode(max(after_id + 1, self.frame_id - self.frame_buffer.slots + 2), encoder)
+
+    def get_latest(self, encoder, after_id=0, timeout=None):
+        after_id = max(after_id, self._history_start)
+        if not self._wait_for(lambda: self.frame_id > after_id, timeout):
+            return None, None
+        return self._encode(self.frame_id, encoder)
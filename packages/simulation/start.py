@@ -5,26 +5,67 @@ Example script to collect the required json formatted data
 of a simulation for the WebGL project.
 """
 
+import asyncio
 import json
+import math
+import queue
+import re
 import logging
+import signal
+import multiprocessing
 import os
+import atexit
+import struct
 import time
-import sys
 import copy
+import functools
+import gzip
+import hashlib
+import io
+import tempfile
+import threading
+import uuid
+import weakref
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta
 import numpy as np
-import ase
-import matplotlib
-from flask import Flask, request, jsonify
-from matplotlib import cm
-from ase import Atoms
+from flask import Flask, Response, request, jsonify, abort, g
 from kmcos.run import KMC_Model, get_tof_names, set_rate_constants
-from kmc_model import base
+import kmc_model
+from kmc_model import base, lattice
 import kmc_settings as settings
+from metrics import Metrics, SamplingProfiler, render_metrics
+from rates import RateConstants, RateTable
+from shared_frames import SharedFrameBuffer, SharedFrameReader
+from timing import timed
+from trajectory import TrajectoryReader, TrajectoryRecorder
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
 
 logger = logging.getLogger(__name__)
 
+# parameters of the model settings, the defaults of every simulation and session
+DEFAULT_PARAMETERS = copy.deepcopy(settings.parameters)
+
+# matplotlib tab10 and Accent colours, baked to keep matplotlib out of the import path
+COVERAGE_COLORS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd',
+                   '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf']
+TOF_COLORS = ['#7fc97f', '#beaed4', '#fdc086', '#ffff99', '#386cb0', '#f0027f', '#bf5b17', '#666666']
+
+def hex2rgb(color):
+    return [int(color[i:i + 2], 16) / 255 for i in (1, 3, 5)]
+
+def eval_atoms(expression):
+    """
+    Evaluate an ASE Atoms expression of kmc_settings (representations), ASE is
+    only imported once one is needed.
+    """
+    from ase import Atoms
+    return eval(expression, dict(globals(), Atoms=Atoms))
+
 # https://stackoverflow.com/a/7205107
 def merge_dict(a: dict, b: dict, path=[]):
     """
@@ -40,6 +81,184 @@ def merge_dict(a: dict, b: dict, path=[]):
             a[key] = b[key]
     return a
 
+def _json_default(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+def dumps_json(data):
+    """
+    Serialize data as JSON, NumPy arrays become (nested) lists.
+    """
+    return json.dumps(data, default=_json_default)
+
+def dumps_msgpack(data):
+    """
+    Serialize data as MessagePack, NumPy arrays become maps of
+    {"dtype", "shape", "data"} with the raw array buffer as binary data.
+    """
+    def default(obj):
+        if isinstance(obj, np.ndarray):
+            obj = np.ascontiguousarray(obj)
+            return {"dtype": obj.dtype.str, "shape": list(obj.shape),
+                    "data": memoryview(obj).cast('B')}
+        if isinstance(obj, np.generic):
+            return obj.item()
+        raise TypeError(f'Object of type {type(obj).__name__} is not MessagePack serializable')
+    return msgpack.packb(data, default=default, use_bin_type=True)
+
+def dumps_buffers(data):
+    """
+    Serialize data as the header length (uint32, little endian), a JSON header
+    and the raw NumPy array buffers. In the header every array is replaced by
+    {"offset", "dtype", "shape"}, the offset is counted from the end of the
+    header and every buffer starts 8 byte aligned.
+    """
+    buffers = []
+    offset = 0
+    def default(obj):
+        nonlocal offset
+        if isinstance(obj, np.ndarray):
+            obj = np.ascontiguousarray(obj)
+            padding = -obj.nbytes % 8
+            descriptor = {"offset": offset, "dtype": obj.dtype.str, "shape": list(obj.shape)}
+            buffers.append(memoryview(obj).cast('B'))
+            buffers.append(bytes(padding))
+            offset += obj.nbytes + padding
+            return descriptor
+        return _json_default(obj)
+    header = json.dumps(data, default=default).encode()
+    header += b' ' * (-(len(header) + 4) % 8)
+    return b''.join([struct.pack('<I', len(header)), header, *buffers])
+
+FRAME_ENCODERS = {
+    'application/json': dumps_json,
+    'application/octet-stream': dumps_buffers,
+}
+if msgpack:
+    FRAME_ENCODERS['application/x-msgpack'] = dumps_msgpack
+
+def get_frame_mimetype(accept_mimetypes):
+    """Return the mimetype of FRAME_ENCODERS best matching the (parsed) Accept header."""
+    return accept_mimetypes.best_match(FRAME_ENCODERS, default='application/json')
+
+def parse_size(value):
+    """
+    Return the lattice size of an int, a list of ints or a string like '40' or
+    '40x30' as int or list, None if value is None or empty. Raises ValueError
+    if it is not positive integers.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        value = [int(n) for n in value.lower().split('x')]
+    size = [int(n) for n in value] if isinstance(value, (list, tuple)) else [int(value)]
+    if any(n < 1 for n in size):
+        raise ValueError(f'Lattice size {value} is not positive')
+    return size[0] if len(size) == 1 else size
+
+class FrameView:
+    """
+    Level of detail of the frames served to a client, instead of the species of
+    all sites as `config`:
+
+    * window [x0, y0, x1, y1]: only the sites of the unit cells x0 <= x < x1 and
+      y0 <= y < y1 as `config` (in the order of the full config), and the `window`
+    * cell: per block of cell x cell unit cells (of the window) the number of
+      sites occupied by every species as `coverageGrid` {"cell", "counts"
+      (blocks x, blocks y, species), "sites" (blocks x, blocks y)}
+
+    Views are shared by all requests with the same arguments (get_frame_view),
+    so frame sources cache their payloads per view.
+    """
+    def __init__(self, site_shape, species_count, window=None, cell=None):
+        self.site_shape = site_shape
+        self.species_count = species_count
+        self.window = window
+        self.cell = cell
+        self._encoders = {}
+
+    def __call__(self, frame):
+        if "visualization" not in frame:
+            # fast-forward frames have no lattice
+            return frame
+        species = np.asarray(frame["visualization"]["config"]).reshape(self.site_shape)
+        visualization = {}
+        if self.window:
+            x0, y0, x1, y1 = self.window
+            species = species[x0:x1, y0:y1]
+            visualization["window"] = list(self.window)
+        if self.cell:
+            visualization["coverageGrid"] = self._coverage_grid(species)
+        else:
+            visualization["config"] = species.ravel()
+        return dict(frame, visualization=visualization)
+
+    def _coverage_grid(self, species):
+        size_x, size_y = species.shape[:2]
+        blocks_x, blocks_y = -(-size_x // self.cell), -(-size_y // self.cell)
+        block = ((np.arange(size_x) // self.cell)[:, np.newaxis] * blocks_y +
+                 np.arange(size_y) // self.cell)
+        block = np.broadcast_to(block[:, :, np.newaxis, np.newaxis], species.shape)
+        counts = np.bincount((block * self.species_count + species).ravel(),
+                             minlength=blocks_x * blocks_y * self.species_count)
+        counts = counts.reshape(blocks_x, blocks_y, self.species_count)
+        dtype = np.uint16 if species[0, 0].size * self.cell ** 2 < 2 ** 16 else np.uint32
+        return {"cell": self.cell, "counts": counts.astype(dtype),
+                "sites": counts.sum(axis=2).astype(dtype)}
+
+    def encoder(self, encoder):
+        """Return encoder applied to the view of a frame, the same function for an encoder."""
+        if encoder not in self._encoders:
+            self._encoders[encoder] = lambda frame: encoder(self(frame))
+        return self._encoders[encoder]
+
+@functools.lru_cache(maxsize=64)
+def _frame_view(site_shape, species_count, window, cell):
+    return FrameView(site_shape, species_count, window, cell)
+
+def get_frame_view(kmc_model, args):
+    """
+    Return the FrameView of the `window` ("x0,y0,x1,y1" unit cells) and `cell`
+    request args for the frames of kmc_model, None for full frames.
+    Raises ValueError if the args are invalid.
+    """
+    window, cell = args.get('window'), args.get('cell')
+    if window is None and cell is None:
+        return None
+    if kmc_model.keyframe_interval:
+        raise ValueError("Level of detail needs full frames, frames are delta encoded")
+    size_x, size_y = kmc_model.site_shape[:2]
+    if window is not None:
+        try:
+            x0, y0, x1, y1 = (int(n) for n in window.split(','))
+        except ValueError:
+            raise ValueError("Window is not x0,y0,x1,y1") from None
+        if not (0 <= x0 < x1 <= size_x and 0 <= y0 < y1 <= size_y):
+            raise ValueError(f"Window is not within the {size_x}x{size_y} lattice")
+        window = (x0, y0, x1, y1)
+    if cell is not None:
+        try:
+            cell = int(cell)
+        except ValueError:
+            raise ValueError("Cell is not an integer") from None
+        if cell < 1:
+            raise ValueError("Cell is not positive")
+    return _frame_view(kmc_model.site_shape, kmc_model.species_count, window, cell)
+
+def coords_to_block(coords):
+    """
+    Turn a list of {"x", "y", "z"[, "type"]} dicts into a float32 (n, 3) block
+    of positions and the list of types.
+    """
+    block = {"positions": np.array([[c["x"], c["y"], c["z"]] for c in coords],
+                                   dtype=np.float32).reshape(-1, 3)}
+    if coords and "type" in coords[0]:
+        block["types"] = [c["type"] for c in coords]
+    return block
+
 # https://stackoverflow.com/a/48359835
 def rgba2rgb(color, background=[1.0, 1.0, 1.0]):
     alpha = color[3]
@@ -47,6 +266,402 @@ def rgba2rgb(color, background=[1.0, 1.0, 1.0]):
             np.floor((1 - alpha) * background[1]*255 + alpha * color[1]*255 + 0.5)/255,
             np.floor((1 - alpha) * background[2]*255 + alpha * color[2]*255 + 0.5)/255]
 
+# version of the initial data layout, part of the cache key
+INITIAL_DATA_VERSION = 2
+
+# InitialPayload of every model built in this process, by WebGLInterface.get_initial_data_key
+INITIAL_PAYLOADS = {}
+
+class InitialPayload:
+    """
+    Initial data of a model, serialized once: the JSON bytes (and their gzip
+    compression) and the typed array formats, each encoded on first use and
+    stored with its ETag.
+    """
+    def __init__(self, key, json_bytes, gzip_bytes=None):
+        self.key = key
+        self.data = json.loads(json_bytes)
+        self._arrays = None
+        self._encoded = {}
+        self._lock = threading.Lock()
+        self._store(('application/json', False), json_bytes)
+        self._store(('application/json', True), gzip_bytes or gzip.compress(json_bytes, mtime=0))
+
+    def _store(self, key, payload):
+        self._encoded[key] = (payload, hashlib.sha1(payload).hexdigest())
+
+    @property
+    def arrays(self):
+        """
+        The initial data with typed arrays instead of coordinate dicts:
+        float32 position blocks for sites and species.
+        """
+        if self._arrays is None:
+            initial_arrays = copy.deepcopy(self.data)
+            visualization = initial_arrays["visualization"]
+            visualization["sites"] = coords_to_block(visualization["sites"])["positions"]
+            visualization["fixedSpecies"] = coords_to_block(visualization["fixedSpecies"])
+            visualization["species"] = [coords_to_block(spec) for spec in visualization["species"]]
+            # arrays of the dynamic data, as in the frames of the run loop
+            visualization["config"] = np.array(visualization["config"], dtype=np.uint8)
+            for entry in initial_arrays["plots"]["plotData"]:
+                for values in entry["tof"] + entry["coverage"]:
+                    values["values"] = np.array(values["values"], dtype=np.float64)
+            self._arrays = initial_arrays
+        return self._arrays
+
+    def encode(self, mimetype, gzipped=False):
+        """Return (payload, etag) of the initial data as one of the FRAME_ENCODERS mimetypes."""
+        with self._lock:
+            return self._encode(mimetype, gzipped)
+
+    def _encode(self, mimetype, gzipped):
+        key = (mimetype, gzipped)
+        if key not in self._encoded:
+            if gzipped:
+                payload = gzip.compress(self._encode(mimetype, False)[0], mtime=0)
+            else:
+                payload = FRAME_ENCODERS[mimetype](self.arrays)
+            self._store(key, payload)
+        return self._encoded[key]
+
+    @property
+    def json(self):
+        return self._encoded[('application/json', False)][0]
+
+    @property
+    def gzip(self):
+        return self._encoded[('application/json', True)][0]
+
+class StepScheduler:
+    """
+    Chooses the number of KMC steps per frame from the measured cost of the
+    previous frames:
+
+    * 'fixed': always `steps_per_frame` steps
+    * 'budget': as many steps as fit in the wall-clock `frame_budget` (seconds),
+      minus the time spent per frame outside of do_steps
+    * 'kmc_time': as many steps as needed to advance the kmc_time by
+      `kmc_time_per_frame` (seconds)
+    """
+    MODES = ('fixed', 'budget', 'kmc_time')
+
+    def __init__(self, steps_per_frame, mode='fixed', frame_budget=1./33,
+                 kmc_time_per_frame=None, min_steps=100, max_steps=int(1e8), smoothing=0.5,
+                 max_change=4.0):
+        if mode not in self.MODES:
+            raise ValueError(f'Unknown step scheduler mode {mode}, use one of {self.MODES}')
+        if mode == 'kmc_time' and not kmc_time_per_frame:
+            raise ValueError('Step scheduler mode kmc_time requires kmc_time_per_frame')
+        self.mode = mode
+        self.frame_budget = frame_budget
+        self.kmc_time_per_frame = kmc_time_per_frame
+        self.min_steps = min_steps
+        self.max_steps = max_steps
+        self.smoothing = smoothing
+        self.max_change = max_change
+        self.steps_per_frame = int(steps_per_frame)
+        self.seconds_per_step = None
+        self.kmc_time_per_step = None
+        self.overhead = 0.0
+
+    @property
+    def step_rate(self):
+        """Measured KMC steps per wall-clock second."""
+        return 1. / self.seconds_per_step if self.seconds_per_step else 0.0
+
+    def reset_estimates(self):
+        """Forget the measured costs, e.g. after the rate constants changed."""
+        self.seconds_per_step = None
+        self.kmc_time_per_step = None
+
+    def _smooth(self, estimate, value):
+        if estimate is None:
+            return value
+        return self.smoothing * value + (1 - self.smoothing) * estimate
+
+    def update(self, steps, step_seconds, frame_seconds, kmc_time_advance):
+        """
+        Feed the measurements of the last frame and return the number of steps
+        for the next one.
+        """
+        if steps > 0 and step_seconds > 0:
+            self.seconds_per_step = self._smooth(self.seconds_per_step, step_seconds / steps)
+            self.overhead = self._smooth(self.overhead, max(frame_seconds - step_seconds, 0.0))
+        if steps > 0 and kmc_time_advance > 0:
+            self.kmc_time_per_step = self._smooth(self.kmc_time_per_step, kmc_time_advance / steps)
+        if self.mode == 'budget' and self.seconds_per_step:
+            target = max(self.frame_budget - self.overhead, 0.0) / self.seconds_per_step
+        elif self.mode == 'kmc_time' and self.kmc_time_per_step:
+            target = self.kmc_time_per_frame / self.kmc_time_per_step
+        else:
+            return self.steps_per_frame
+        target = min(max(target, self.steps_per_frame / self.max_change),
+                     self.steps_per_frame * self.max_change)
+        self.steps_per_frame = int(min(max(target, self.min_steps), self.max_steps))
+        return self.steps_per_frame
+
+class ParameterUpdates:
+    """
+    Sends slider updates from the server to the simulation process without
+    blocking: changed values are merged into one pending {label: value} dict,
+    which is put on the parameter queue `interval` seconds after the first
+    change (and retried while the queue is full).
+    """
+    def __init__(self, parameter_queue, interval=0.05):
+        self.parameter_queue = parameter_queue
+        self.interval = interval
+        self._pending = {}
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def update(self, label, value):
+        with self._lock:
+            self._pending[label] = value
+            if self._timer is None:
+                self._schedule()
+
+    def _schedule(self):
+        self._timer = threading.Timer(self.interval, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            self._timer = None
+            if not self._pending:
+                return
+            try:
+                self.parameter_queue.put_nowait(self._pending)
+                self._pending = {}
+            except queue.Full:
+                self._schedule()
+
+    def clear(self):
+        with self._lock:
+            self._pending = {}
+
+def get_stderr(tofs, occs):
+    """Return the standard errors of the TOF and coverage entries of a frame, (None, None) if it has none."""
+    if tofs and "stderr" in tofs[0]:
+        return [tof["stderr"] for tof in tofs], [occ["stderr"] for occ in occs]
+    return None, None
+
+class PlotHistory:
+    """
+    Ring buffer of the plot data (kmc_time, TOF and coverage values) with a
+    monotonically increasing sequence number per entry. The arrays are allocated
+    in shared memory on the first append, so an append in the simulation process
+    (after the fork) is visible to the HTTP handlers of the server process.
+    With stderr the standard errors of the TOF and coverage values are kept too.
+    """
+    def __init__(self, length=30, stderr=False):
+        self.length = length
+        self.stderr = stderr
+        # one spare slot for the entry being appended while the others are read
+        self.slots = length + 1
+        # [number of appended entries, sequence number of the first entry since clear]
+        self._counters = np.frombuffer(multiprocessing.RawArray('q', 2), dtype=np.int64)
+        self.kmc_time = None
+        self.tof = None
+        self.coverage = None
+        self.tof_stderr = None
+        self.coverage_stderr = None
+
+    @staticmethod
+    def _shared_array(shape):
+        size = int(np.prod(shape, dtype=np.int64))
+        return np.frombuffer(multiprocessing.RawArray('d', size), dtype=np.float64).reshape(shape)
+
+    @property
+    def count(self):
+        """Sequence number of the next entry."""
+        return int(self._counters[0])
+
+    def __len__(self):
+        return min(self.count - int(self._counters[1]), self.length)
+
+    def append(self, kmc_time, tof, coverage, tof_stderr=None, coverage_stderr=None):
+        if self.kmc_time is None:
+            self.kmc_time = self._shared_array((self.slots,))
+            self.tof = self._shared_array((self.slots,) + np.shape(tof))
+            self.coverage = self._shared_array((self.slots,) + np.shape(coverage))
+            if self.stderr:
+                self.tof_stderr = self._shared_array(self.tof.shape)
+                self.coverage_stderr = self._shared_array(self.coverage.shape)
+        slot = self.count % self.slots
+        self.kmc_time[slot] = kmc_time
+        self.tof[slot] = tof
+        self.coverage[slot] = coverage
+        if self.stderr:
+            self.tof_stderr[slot] = 0.0 if tof_stderr is None else tof_stderr
+            self.coverage_stderr[slot] = 0.0 if coverage_stderr is None else coverage_stderr
+        self._counters[0] += 1
+
+    def clear(self):
+        self._counters[1] = self._counters[0]
+
+    def _sequences(self, after=None, last=None):
+        end = self.count
+        start = max(end - self.length, int(self._counters[1]))
+        if after is not None:
+            start = max(start, after + 1)
+        if last is not None:
+            start = max(start, end - last)
+        return np.arange(start, end)
+
+    def get_window(self, after=None, last=None):
+        """
+        Return the entries after the sequence number `after` and/or the `last`
+        entries as columns: {"sequence", "kmcTime", "tof", "coverage"} (and
+        "tofStderr", "coverageStderr" with stderr), where sequence is the number
+        of the first returned entry.
+        """
+        while True:
+            sequences = self._sequences(after, last)
+            if self.kmc_time is None or not len(sequences):
+                window = {"sequence": self.count, "kmcTime": np.zeros(0), "tof": [], "coverage": []}
+                if self.stderr:
+                    window.update(tofStderr=[], coverageStderr=[])
+                return window
+            slots = sequences % self.slots
+            window = {
+                "sequence": int(sequences[0]),
+                "kmcTime": self.kmc_time[slots],
+                "tof": self.tof[slots],
+                "coverage": self.coverage[slots],
+            }
+            if self.stderr:
+                window.update(tofStderr=self.tof_stderr[slots],
+                              coverageStderr=self.coverage_stderr[slots])
+            # retry if the appends meanwhile reached the slots that were read
+            if sequences[0] > self.count - self.slots:
+                return window
+
+    def plot_data(self, last=None):
+        """Return the `last` entries as the plotData list of the dynamic data."""
+        window = self.get_window(last=last)
+        if not self.stderr:
+            return [{
+                "kmcTime": float(kmc_time),
+                "tof": [{"values": values} for values in tof],
+                "coverage": [{"values": values} for values in coverage],
+            } for kmc_time, tof, coverage in zip(window["kmcTime"], window["tof"],
+                                                 window["coverage"])]
+        return [{
+            "kmcTime": float(kmc_time),
+            "tof": [{"values": values, "stderr": stderr}
+                    for values, stderr in zip(tof, tof_stderr)],
+            "coverage": [{"values": values, "stderr": stderr}
+                         for values, stderr in zip(coverage, coverage_stderr)],
+        } for kmc_time, tof, coverage, tof_stderr, coverage_stderr in zip(
+            window["kmcTime"], window["tof"], window["coverage"], window["tofStderr"],
+            window["coverageStderr"])]
+
+class ReplicaEnsemble:
+    """
+    Replicas of a WebGLInterface with their own random seeds, each in a process
+    forked from the server with the allocated lattice (run_replica). They get the
+    parameter changes, resets and snapshots of the simulation process, do a batch
+    of steps when it does one (at most) and publish the TOFs and coverages of
+    every batch; the simulation process sends
+    the mean over itself and the replicas with the standard errors in its frames.
+
+    Parameter changes and resets count up the generation, values the replicas
+    published for an older generation are left out of the mean.
+    """
+    def __init__(self, model, replicas, n_tofs, occupation_shape, seed=1):
+        self.model = model
+        # number of simulations, including the simulation process
+        self.replicas = replicas
+        self.seed = seed
+        self.tof_shape = (n_tofs, 2)
+        self.occupation_shape = tuple(occupation_shape)
+        self._width = 1 + 2 * n_tofs + int(np.prod(occupation_shape))
+        # [generation, TOFs, occupation] published by every replica
+        self._lock = multiprocessing.Lock()
+        self._values = np.frombuffer(
+            multiprocessing.RawArray('d', (replicas - 1) * self._width),
+            dtype=np.float64).reshape(replicas - 1, self._width)
+        self._values[:, 0] = -1
+        self._queues = [multiprocessing.Queue() for _ in range(replicas - 1)]
+        # batches of steps of the simulation process, the replicas keep pace with them
+        self._batches = multiprocessing.Value('q', 0, lock=False)
+        self._processes = []
+        # simulation process only
+        self.generation = 0
+
+    def start(self):
+        for index in range(1, self.replicas):
+            process = multiprocessing.Process(target=self.model.run_replica, args=(index,),
+                                              daemon=True)
+            process.start()
+            self._processes.append(process)
+
+    def close(self):
+        for process in self._processes:
+            process.kill()
+            process.join()
+        self._processes = []
+
+    def send(self, command_name, *args):
+        """Pass a command (PARAMETERS, RESET, SNAPSHOT) of the simulation process on to the replicas."""
+        if command_name != 'SNAPSHOT':
+            # a snapshot does not change the simulations
+            self.generation += 1
+        for signal_queue in self._queues:
+            signal_queue.put((self.generation, command_name) + args)
+
+    def receive(self, index):
+        """Return the (generation, command_name, *args) messages sent to replica index since the last call."""
+        messages = []
+        try:
+            while True:
+                messages.append(self._queues[index - 1].get_nowait())
+        except queue.Empty:
+            return messages
+
+    def step(self):
+        """Count a batch of steps of the simulation process."""
+        self._batches.value += 1
+
+    def wait_step(self, batches, interval=0.001, max_interval=0.05):
+        """Wait until the simulation process did more than `batches` batches of steps."""
+        while self._batches.value <= batches:
+            time.sleep(interval)
+            # polled less often while the simulation process is paused
+            interval = min(interval * 2, max_interval)
+        return self._batches.value
+
+    def publish(self, index, generation, tof, occupation):
+        row = np.concatenate(([generation], np.ravel(tof), np.ravel(occupation)))
+        with self._lock:
+            self._values[index - 1] = row
+
+    def aggregate(self, single_data):
+        """
+        Return the _get_single_dynamic_data of the simulation process with the TOF and
+        coverage values replaced by the mean over the replicas of the current generation
+        and their standard errors added.
+        """
+        kmc_time, config, tofs, occs = single_data
+        with self._lock:
+            rows = self._values.copy()
+        own = np.concatenate((np.ravel([tof["values"] for tof in tofs]),
+                              np.ravel([occ["values"] for occ in occs])))
+        samples = np.vstack([own, rows[rows[:, 0] == self.generation, 1:]])
+        mean = samples.mean(axis=0)
+        stderr = (samples.std(axis=0, ddof=1) / np.sqrt(len(samples)) if len(samples) > 1
+                  else np.zeros_like(mean))
+        n_tof = int(np.prod(self.tof_shape))
+        tofs = [{"values": values, "stderr": error} for values, error in
+                zip(mean[:n_tof].reshape(self.tof_shape), stderr[:n_tof].reshape(self.tof_shape))]
+        occs = [{"values": values, "stderr": error} for values, error in
+                zip(mean[n_tof:].reshape(self.occupation_shape),
+                    stderr[n_tof:].reshape(self.occupation_shape))]
+        return kmc_time, config, tofs, occs
+
+
 class WebGLInterface(KMC_Model):
     """
     KMC_Model wrapper to collect the data as class attributes.
@@ -55,51 +670,644 @@ class WebGLInterface(KMC_Model):
                  system_name='kmc_model', banner=True, print_rates=False, autosend=True,
                  steps_per_frame=50000, random_seed=None, cache_file=None, buffer_parameter=None,
                  threshold_parameter=None, sampling_steps=None, execution_steps=None,
-                 save_limit=None):
-        super().__init__(image_queue, parameter_queue, signal_queue, size, system_name, banner,
-                         print_rates, autosend, steps_per_frame, random_seed, cache_file,
-                         buffer_parameter, threshold_parameter, sampling_steps, execution_steps,
-                         save_limit)
+                 save_limit=None, keyframe_interval=None, scheduler=None, initial_cache_dir=None,
+                 history_length=30, plot_window=30, rate_table=None, snapshot=None, record=None,
+                 accelerate=False, replicas=1):
+        # wall-clock seconds of the initialization phases, reported by /health
+        init_phases = {}
+        with timed(init_phases, 'model'):
+            super().__init__(image_queue, parameter_queue, signal_queue, size, system_name, banner,
+                             print_rates, autosend, steps_per_frame, random_seed, cache_file,
+                             buffer_parameter, threshold_parameter, sampling_steps,
+                             execution_steps, save_limit)
+        self.init_phases = init_phases
+        # temporal acceleration of the fast quasi-equilibrated processes (do_acc_steps),
+        # only models compiled with kmcos --temp_acc can do it
+        self.accelerate = bool(accelerate) and self.can_accelerate
+        if accelerate and not self.can_accelerate:
+            logger.warning('The model was not compiled with temporal acceleration (kmcos --temp_acc), '
+                           'it runs without')
         self.parameter_queue = parameter_queue
+        self.parameter_updates = ParameterUpdates(parameter_queue)
+        self._rate_constants = None
+        self.rate_table = None
+        if rate_table:
+            self.rate_table = RateTable(rate_table)
+            if not self.rate_table.matches(settings.parameters):
+                logger.warning('Rate table %s was built for other processes or parameter values, '
+                               'it is not used', rate_table)
+                self.rate_table = None
         self._pid = None
-        self._history = []
+        self.plot_history = PlotHistory(max(history_length, plot_window), stderr=replicas > 1)
+        self.plot_window = plot_window
+        self.keyframe_interval = keyframe_interval
+        self._frame_sequence = 0
+        self._frames_since_keyframe = 0
+        self._last_config = None
+        self._keyframe_requested = multiprocessing.Event()
+        self.frame_buffer = None
+        # number of the last frame sent by the run loop, the frame id of the frame sources
+        self._frame_number = 0
+        self.scheduler = scheduler or StepScheduler(steps_per_frame)
+        # step rate and steps per frame of the run loop, readable from the parent process
+        self._step_stats = multiprocessing.Array('d', [0.0, self.scheduler.steps_per_frame],
+                                                 lock=False)
+        # fast-forward state of the run loop, readable from the parent process: active, KMC time
+        # at the start, target and now, wall-clock time at the start, end and now, batches, frames
+        self._fast_forward = multiprocessing.Array('d', 9, lock=False)
+        self._fast_forward_interval = 10
         self.dynamic_data = image_queue
-        self.initial_data = self._get_initial_data()
-        self.default_params = copy.deepcopy(settings.parameters)
+        self.system_name = system_name
+        self.metrics = Metrics()
+        self._do_steps_seconds = self.metrics.histogram(
+            'simulation_do_steps_seconds', 'Wall-clock seconds of the KMC steps of a frame')
+        self._frame_build_seconds = self.metrics.histogram(
+            'simulation_frame_build_seconds', 'Seconds to build a frame from the lattice state')
+        self._queue_put_seconds = self.metrics.histogram(
+            'simulation_frame_queue_put_seconds', 'Seconds waiting to put a frame on the image queue')
+        self._kmc_time_advance = self.metrics.histogram(
+            'simulation_kmc_time_advance', 'KMC time advance per frame',
+            buckets=tuple(10.0 ** np.arange(-9, 4)))
+        self._frames_total = self.metrics.counter(
+            'simulation_frames_total', 'Frames built by the simulation process')
+        self._frames_dropped = self.metrics.counter(
+            'simulation_frames_dropped_total', 'Frames dropped because the image queue was full')
+        self.frame_get_seconds = self.metrics.histogram(
+            'simulation_frame_get_seconds', 'Seconds of a request to wait for and serialize a frame')
+        self.frame_encode_seconds = self.metrics.histogram(
+            'simulation_frame_encode_seconds', 'Seconds to serialize a frame for a request')
+        self._timed_encoders = {}
+        self._command_seconds = self.metrics.histogram(
+            'simulation_command_seconds',
+            'Seconds from sending a command to the simulation process until it acknowledged it')
+        # commands of the server to the run loop (command), acknowledged on _command_acks
+        self._command_acks = multiprocessing.Queue()
+        self._command_lock = threading.Lock()
+        self._command_id = 0
+        # run loop only, set by the PAUSE and RESUME signals
+        self.paused = False
+        self.metrics.gauge('simulation_steps_per_second', 'KMC steps per wall-clock second',
+                           function=lambda: self.step_rate)
+        self.metrics.gauge('simulation_steps_per_frame', 'KMC steps per frame',
+                           function=lambda: self.batch_size)
+        self.metrics.gauge('simulation_frame_queue_depth', 'Frames waiting in the image queue',
+                           function=self._queue_depth)
+        self._profile_results = multiprocessing.Queue()
+        self._profile_lock = threading.Lock()
+        with timed(self.init_phases, 'initialData'):
+            self.initial_payload = self._load_initial_payload(initial_cache_dir)
+        self.initial_data = self.initial_payload.data
+        self.default_params = copy.deepcopy(DEFAULT_PARAMETERS)
+        self.snapshot_path = snapshot
+        # state the run loop starts from and returns to on reset, cold start if None
+        self.reset_snapshot = self._read_snapshot(snapshot)
+        # lattice shape (x, y, z, site) and number of species of the frames
+        self.site_shape = self._snapshot_shape()
+        self.species_count = len(self.settings.representations)
+        self.recorder = None
+        if record:
+            self.recorder = TrajectoryRecorder(record, self.initial_payload,
+                                               [int(n) for n in self.size])
+        # replicas of the simulation for the mean TOFs and coverages of the frames
+        self.ensemble = None
+        if replicas > 1:
+            state = self.get_atoms(geometry=False)
+            self.ensemble = ReplicaEnsemble(self, replicas, len(get_tof_names()),
+                                            np.shape(state.occupation), seed=settings.random_seed)
 
-    def reset_simulation(self):
-        while not self.parameter_queue.empty():
-            self.parameter_queue.get()
+    def start(self):
+        super().start()
+        if self.ensemble is not None:
+            self.ensemble.start()
+
+    def kill(self):
+        if self.ensemble is not None:
+            self.ensemble.close()
+        super().kill()
+
+    def reset_simulation(self, parameters=None):
+        if parameters is None:
+            parameters = settings.parameters
+        self.parameter_updates.clear()
+        try:
+            while True:
+                self.parameter_queue.get_nowait()
+        except queue.Empty:
+            pass
+        # the rate constants of the simulation process are reset by the RESET signal
         for param in self.default_params.keys():
-            settings.parameters[param]['value'] = self.default_params[param]['value']
-        set_rate_constants(settings.parameters, False, self.can_accelerate)
+            parameters[param]['value'] = self.default_params[param]['value']
+
+    def _start_process(self):
+        self._pid = os.getpid()
+        # forked from the server, whose event loop may have installed signal handlers
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
 
     def run(self):
         """Runs the model indefinitely. To control the
         simulations, model must have been initialized
         with proper Queues."""
-        self._pid = os.getpid()
-        if not base.is_allocated():
+        self._start_process()
+        if self.reset_snapshot is not None:
+            self.restore_snapshot(self.reset_snapshot)
+            self.plot_history.clear()
+        elif not base.is_allocated():
             self.reset()
+        self._record_parameters()
         while True:
-            wait_until_time = datetime.utcnow() + timedelta(seconds=1./33)
-            self.do_steps(self.steps_per_frame, progress=False)
-            if self.dynamic_data.full():
-                self.dynamic_data.get()
-            self.dynamic_data.put(self._get_dynamic_data(slider=True))
+            while self.paused:
+                # blocks without using the CPU until the next signal
+                self._handle_signal(self.signal_queue.get())
+            wait_until_time = datetime.utcnow() + timedelta(seconds=self.scheduler.frame_budget)
+            frame_start = time.perf_counter()
+            while self.signal_queue is not None and not self.signal_queue.empty():
+                self._handle_signal(self.signal_queue.get())
+            if self.paused:
+                continue
+            fast_forward = bool(self._fast_forward[0])
+            kmc_time = base.get_kmc_time()
+            self.steps_per_frame = self.scheduler.steps_per_frame
+            step_start = time.perf_counter()
+            self.do_frame_steps(self.steps_per_frame)
+            step_seconds = time.perf_counter() - step_start
+            kmc_time_advance = base.get_kmc_time() - kmc_time
+            self._do_steps_seconds.observe(step_seconds)
+            self._kmc_time_advance.observe(kmc_time_advance)
+            if self.ensemble is not None:
+                self.ensemble.step()
+            if fast_forward:
+                self._fast_forward_batch()
+            else:
+                self._send_frame()
             if not self.parameter_queue.empty():
+                changes = {}
                 while not self.parameter_queue.empty():
-                    parameters = self.parameter_queue.get()
-                    settings.parameters.update(parameters)
-                set_rate_constants(parameters, False, self.can_accelerate)
+                    changes.update(self.parameter_queue.get())
+                self._update_parameters(changes)
+                self._record_parameters(changes)
+                if self.ensemble is not None:
+                    self.ensemble.send('PARAMETERS', changes)
+                self.scheduler.reset_estimates()
+            if fast_forward:
+                # no frame to wait for, the step costs would skew the estimates of the scheduler
+                continue
+            self.scheduler.update(self.steps_per_frame, step_seconds,
+                                  time.perf_counter() - frame_start, kmc_time_advance)
+            self._step_stats[:] = [self.scheduler.step_rate, self.scheduler.steps_per_frame]
             seconds_to_sleep = (wait_until_time - datetime.utcnow()).total_seconds()
             if seconds_to_sleep < 0:
                 seconds_to_sleep = 0
             time.sleep(seconds_to_sleep)
 
+    def _start_fast_forward(self, kmc_time=None, seconds=None, frame_interval=10):
+        kmc_now = base.get_kmc_time()
+        now = time.time()
+        self._fast_forward_interval = max(int(frame_interval), 1)
+        self._fast_forward[:] = [1, kmc_now, kmc_now + kmc_time if kmc_time else np.inf, kmc_now,
+                                 now, now + seconds if seconds else np.inf, now, 0, 0]
+
+    def _stop_fast_forward(self):
+        if self._fast_forward[0]:
+            self._fast_forward[0] = 0
+            # the lattice changed in the frames without it, clients need the full config
+            self._keyframe_requested.set()
+            self._send_frame()
+            self._fast_forward[8] += 1
+
+    def _fast_forward_batch(self):
+        """
+        Count a batch of steps in fast-forward mode, send only every frame_interval-th
+        frame (without the lattice) and return to real time at the target KMC time or
+        wall-clock time with a full frame.
+        """
+        state = self._fast_forward
+        state[3] = base.get_kmc_time()
+        state[6] = time.time()
+        state[7] += 1
+        if state[3] >= state[2] or state[6] >= state[5]:
+            self._stop_fast_forward()
+        elif state[7] % self._fast_forward_interval == 0:
+            self._send_frame(summary=True)
+            state[8] += 1
+
+    @property
+    def fast_forward(self):
+        """Progress of the last fast-forward, reported by /health."""
+        active, kmc_start, kmc_target, kmc_time, start, end, now, batches, frames = self._fast_forward
+        if not start:
+            return dict(active=False)
+        progress = [(now - start) / (end - start) if np.isfinite(end) else 0.0]
+        if np.isfinite(kmc_target):
+            progress.append((kmc_time - kmc_start) / (kmc_target - kmc_start))
+        return dict(active=bool(active),
+                    kmcTime=kmc_time,
+                    kmcTimeAdvance=kmc_time - kmc_start,
+                    targetKmcTimeAdvance=kmc_target - kmc_start if np.isfinite(kmc_target) else None,
+                    seconds=now - start,
+                    maxSeconds=end - start if np.isfinite(end) else None,
+                    progress=min(max(progress), 1.0),
+                    batches=int(batches),
+                    frames=int(frames))
+
+    def do_frame_steps(self, n):
+        """Do n KMC steps, with temporal acceleration if enabled."""
+        if self.accelerate:
+            self.do_acc_steps(n, stats=False)
+        else:
+            self.do_steps(n, progress=False)
+
+    @property
+    def acceleration(self):
+        """Temporal acceleration state and parameters, reported by /health."""
+        acceleration = dict(enabled=self.accelerate, available=self.can_accelerate)
+        if self.can_accelerate:
+            acceleration.update(
+                bufferParameter=self.settings.buffer_parameter,
+                thresholdParameter=self.settings.threshold_parameter,
+                samplingSteps=self.settings.sampling_steps,
+                executionSteps=self.settings.execution_steps,
+                saveLimit=self.settings.save_limit)
+        return acceleration
+
+    def _send_frame(self, single_data=None, summary=False):
+        """
+        Write the frame of the current state (or of the given _get_single_dynamic_data)
+        to the frame buffer or put it on the image queue, and add it to the plot
+        history and the recording. A summary frame (of a fast-forward) leaves out the
+        lattice and is not recorded.
+        """
+        with self._frame_build_seconds.time():
+            single_data = single_data or self._get_single_dynamic_data(summary=summary)
+            if self.ensemble is not None:
+                single_data = self.ensemble.aggregate(single_data)
+            self._append_plot_history(single_data)
+            if self.frame_buffer is not None:
+                self._write_frame_buffer(single_data)
+            elif summary:
+                frame = self._get_summary_frame()
+            else:
+                frame = self._get_dynamic_data(single_data=single_data, slider=True,
+                                               delta=bool(self.keyframe_interval))
+        self._frame_number += 1
+        if self.frame_buffer is None:
+            if self.dynamic_data.full():
+                self.dynamic_data.get()
+                self._frames_dropped.inc()
+            with self._queue_put_seconds.time():
+                self.dynamic_data.put((self._frame_number, frame))
+        self._frames_total.inc()
+        if self.recorder is not None and not summary:
+            kmc_time, config, tofs, occs = single_data
+            self.recorder.append(kmc_time, config, [tof["values"] for tof in tofs],
+                                 [occ["values"] for occ in occs])
+
+    def _record_parameters(self, changes=None):
+        """Record the changed parameters, all parameter values if None."""
+        if self.recorder is not None:
+            self.recorder.log_parameters(changes or {
+                label: parameter['value'] for label, parameter in settings.parameters.items()})
+
     def get_pid(self):
         return self._pid
 
+    def command(self, command, timeout=5):
+        """
+        Send a command (e.g. PAUSE, RESUME, ('STEP', steps), ('RESET', target)) to the run
+        loop and wait until it handled it. Return its acknowledgement with the state of the
+        run loop after the command and the latency in `latencySeconds`, None if the
+        signal queue stays full or the simulation process does not answer within timeout
+        seconds.
+        """
+        with self._command_lock:
+            self._command_id += 1
+            start = time.perf_counter()
+            try:
+                self.signal_queue.put(('COMMAND', self._command_id, command), timeout=1)
+            except queue.Full:
+                return None
+            while True:
+                try:
+                    ack = self._command_acks.get(timeout=max(start + timeout - time.perf_counter(), 0))
+                except queue.Empty:
+                    return None
+                # acknowledgements of earlier commands that timed out are dropped
+                if ack['id'] == self._command_id:
+                    break
+            ack['latencySeconds'] = time.perf_counter() - start
+            self._command_seconds.observe(ack['latencySeconds'])
+            return ack
+
+    def request_snapshot(self):
+        """
+        Makes the run loop take a snapshot of its current state as the new reset snapshot.
+        Return False if the signal queue stays full (the run loop does not keep up).
+        """
+        try:
+            self.signal_queue.put('SNAPSHOT', timeout=1)
+        except queue.Full:
+            return False
+        return True
+
+    def request_fast_forward(self, kmc_time=None, seconds=None, frame_interval=10):
+        """
+        Makes the run loop do KMC steps without waiting for the frame rate until kmc_time
+        (seconds of KMC time) passed or after `seconds` of wall-clock time, sending only
+        every frame_interval-th frame, then return to real time. None stops it.
+        Return False if the signal queue stays full (the run loop does not keep up).
+        """
+        if kmc_time is None and seconds is None:
+            message = 'REALTIME'
+        else:
+            message = ('FASTFORWARD', kmc_time, seconds, frame_interval)
+        try:
+            self.signal_queue.put(message, timeout=1)
+        except queue.Full:
+            return False
+        return True
+
+    def profile(self, seconds):
+        """
+        Return the collapsed stacks of a SamplingProfiler run over the run loop,
+        None if the simulation process does not answer in time.
+        """
+        with self._profile_lock:
+            while not self._profile_results.empty():
+                self._profile_results.get()
+            try:
+                self.signal_queue.put(('PROFILE', seconds), timeout=1)
+                return self._profile_results.get(timeout=seconds + 5)
+            except (queue.Full, queue.Empty):
+                return None
+
+    def timed_encoder(self, encoder):
+        """
+        Return encoder observing its duration in the frame_encode_seconds histogram,
+        always the same function for an encoder as frame sources cache payloads per encoder.
+        """
+        if encoder not in self._timed_encoders:
+            def encode(frame):
+                with self.frame_encode_seconds.time():
+                    return encoder(frame)
+            self._timed_encoders[encoder] = encode
+        return self._timed_encoders[encoder]
+
+    def _queue_depth(self):
+        try:
+            return self.dynamic_data.qsize()
+        except (AttributeError, NotImplementedError):
+            return math.nan
+
+    def _profile(self, seconds, thread_id):
+        self._profile_results.put(SamplingProfiler([thread_id]).run(seconds))
+
+    def _handle_signal(self, message):
+        command_name, *args = message if isinstance(message, tuple) else (message,)
+        if command_name == 'COMMAND':
+            command_id, command = args
+            self._handle_signal(command)
+            self._acknowledge(command_id)
+        elif command_name == 'PAUSE':
+            self.paused = True
+        elif command_name == 'RESUME':
+            self.paused = False
+        elif command_name == 'STEP':
+            # a batch of steps while paused
+            self.do_frame_steps(args[0] if args and args[0] else self.steps_per_frame)
+            if self.ensemble is not None:
+                self.ensemble.step()
+            self._send_frame()
+        elif command_name == 'RESET':
+            # to the reset snapshot if there is one, to an empty lattice with 'defaults'
+            target = args[0] if args else None
+            for label, parameter in self.default_params.items():
+                settings.parameters[label]['value'] = parameter['value']
+            if self.reset_snapshot is not None and target != 'defaults':
+                self.restore_snapshot(self.reset_snapshot)
+            else:
+                self._reinitialize()
+            self.scheduler.reset_estimates()
+            self._record_parameters()
+            self._fast_forward[0] = 0
+            if self.ensemble is not None:
+                self.ensemble.send('RESET', target)
+            # the frames from this one on are of the reset state (the frameId of the ack)
+            self.plot_history.clear()
+            self._keyframe_requested.set()
+            self._send_frame()
+        elif command_name == 'SNAPSHOT':
+            self.reset_snapshot = self.get_snapshot()
+            if self.snapshot_path:
+                self._write_snapshot(self.snapshot_path, self.reset_snapshot)
+            if self.ensemble is not None:
+                self.ensemble.send('SNAPSHOT', self.reset_snapshot)
+        elif command_name == 'FASTFORWARD':
+            self._start_fast_forward(*args)
+        elif command_name == 'REALTIME':
+            self._stop_fast_forward()
+        elif command_name == 'PROFILE':
+            threading.Thread(target=self._profile, args=(args[0], threading.get_ident()),
+                             daemon=True).start()
+        else:
+            logger.warning('Unknown signal %r', command_name)
+
+    def _acknowledge(self, command_id, reason=None):
+        """
+        Acknowledge a command with the state of the run loop and the id of its last
+        frame, with the reason if it was not carried out.
+        """
+        ack = dict(id=command_id, paused=self.paused, kmcTime=float(base.get_kmc_time()),
+                   snapshot=self.reset_snapshot is not None, frameId=self._frame_number)
+        if reason is not None:
+            ack['reason'] = reason
+        self._command_acks.put(ack)
+
+    def run_replica(self, index):
+        """
+        Run loop of replica `index` of the ensemble: KMC steps with its own random
+        seed, the parameter changes, resets and snapshots of the simulation process,
+        and the TOFs and coverages of every batch of steps published to the ensemble.
+        """
+        self._start_process()
+        ensemble = self.ensemble
+        if self.reset_snapshot is not None:
+            self.restore_snapshot(self.reset_snapshot)
+        elif not base.is_allocated():
+            self.reset()
+        self.reseed(ensemble.seed + index)
+        self.get_atoms(geometry=False)
+        generation = 0
+        batches = 0
+        while True:
+            batches = ensemble.wait_step(batches)
+            messages = ensemble.receive(index)
+            for generation, command_name, *args in messages:
+                if command_name == 'PARAMETERS':
+                    self._update_parameters(args[0])
+                elif command_name == 'RESET':
+                    for label, parameter in self.default_params.items():
+                        settings.parameters[label]['value'] = parameter['value']
+                    if self.reset_snapshot is not None and args[0] != 'defaults':
+                        self.restore_snapshot(self.reset_snapshot)
+                    else:
+                        self._reinitialize()
+                    self.reseed(ensemble.seed + index)
+                elif command_name == 'SNAPSHOT':
+                    self.reset_snapshot = args[0]
+            if messages:
+                # the TOFs of get_atoms are averaged since its previous call
+                self.get_atoms(geometry=False)
+            self.do_frame_steps(self.batch_size)
+            state = self.get_atoms(geometry=False)
+            ensemble.publish(index, generation, self._get_tof_values(), state.occupation)
+
+    def reseed(self, seed):
+        """Continue the allocated lattice with the random number generator started from seed."""
+        settings.random_seed = seed
+        if hasattr(self.proclist, 'seed_gen') and hasattr(self.proclist, 'put_seed'):
+            self.proclist.put_seed(np.asarray(self.proclist.seed_gen(seed), dtype=np.int32))
+            return
+        configuration = self._get_lattice_species().reshape(self._snapshot_shape())
+        kmc_time = base.get_kmc_time()
+        self._reinitialize()
+        self._set_configuration(configuration)
+        base.set_kmc_time(kmc_time)
+
+    def _reinitialize(self):
+        """Reallocate an empty lattice with the rate constants of the current parameters."""
+        if base.is_allocated():
+            self.deallocate()
+        self.reset()
+        self._rate_constants = None
+        self._last_config = None
+        self._keyframe_requested.set()
+
+    def _snapshot_shape(self):
+        return tuple(int(n) for n in self.lattice.system_size) + (int(self.lattice.spuck),)
+
+    def get_snapshot(self):
+        """
+        Return the lattice state as compressed npz bytes: the species of every site,
+        KMC time and step, the last TOFs, the random seed and random number
+        generator state, and the parameter values.
+        """
+        random_state = (self.proclist.get_seed() if hasattr(self.proclist, 'get_seed')
+                        else np.zeros(0, dtype=np.int32))
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            configuration=self._get_lattice_species().reshape(self._snapshot_shape()),
+            kmc_time=base.get_kmc_time(),
+            kmc_step=base.get_kmc_step(),
+            tof_data=np.asarray(getattr(self, 'tof_data', []), dtype=np.float64),
+            tof_integ=np.asarray(getattr(self, 'tof_integ', []), dtype=np.float64),
+            random_seed=settings.random_seed,
+            random_state=random_state,
+            parameters=json.dumps({label: str(parameter['value'])
+                                   for label, parameter in settings.parameters.items()}))
+        return buffer.getvalue()
+
+    def restore_snapshot(self, data):
+        """
+        Reallocate the lattice with the random seed of a get_snapshot() state and
+        restore its configuration, KMC time and random number generator state.
+        The Fortran process counters restart from zero, the TOFs continue from
+        the restored values.
+        """
+        snapshot = np.load(io.BytesIO(data))
+        configuration = snapshot['configuration']
+        if configuration.shape != self._snapshot_shape():
+            raise ValueError(f'Snapshot of a {configuration.shape} lattice, '
+                             f'the model has {self._snapshot_shape()}')
+        settings.random_seed = snapshot['random_seed'].item()
+        self._reinitialize()
+        self._set_configuration(configuration)
+        base.set_kmc_time(float(snapshot['kmc_time']))
+        if hasattr(base, 'set_kmc_step'):
+            base.set_kmc_step(int(snapshot['kmc_step']))
+        if snapshot['random_state'].size and hasattr(self.proclist, 'put_seed'):
+            self.proclist.put_seed(snapshot['random_state'])
+        self.time = base.get_kmc_time()
+        self.steps = base.get_kmc_step()
+        if snapshot['tof_data'].size:
+            self.tof_data = snapshot['tof_data']
+            self.tof_integ = snapshot['tof_integ']
+
+    def _read_snapshot(self, path):
+        if not path or not os.path.exists(path):
+            return None
+        with open(path, 'rb') as snapshot_file:
+            data = snapshot_file.read()
+        snapshot = np.load(io.BytesIO(data))
+        if snapshot['configuration'].shape != self._snapshot_shape():
+            logger.warning('Snapshot %s was taken of another lattice size, it is not used', path)
+            return None
+        defaults = {label: str(parameter['value']) for label, parameter in settings.parameters.items()}
+        if json.loads(str(snapshot['parameters'])) != defaults:
+            logger.warning('Snapshot %s was taken at other parameter values than the defaults', path)
+        logger.info('Loaded snapshot %s', path)
+        return data
+
+    @staticmethod
+    def _write_snapshot(path, data):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(path)),
+                                             delete=False) as tmp:
+                tmp.write(data)
+            os.replace(tmp.name, path)
+        except OSError as exc:
+            logger.warning('Cannot write snapshot %s: %s', path, exc)
+
+    def _update_parameters(self, changes):
+        """Set the changed {label: value} parameters and the rate constants depending on them."""
+        if self._rate_constants is None and not self.can_accelerate:
+            self._rate_constants = RateConstants(settings.parameters)
+        for label, value in changes.items():
+            settings.parameters[label]['value'] = value
+        if self.can_accelerate:
+            set_rate_constants(settings.parameters, False, self.can_accelerate)
+            return
+        rates = None
+        if self.rate_table is not None:
+            rates = self.rate_table.lookup(settings.parameters)
+        if rates is None:
+            rates = self._rate_constants.update(settings.parameters, changes)
+        else:
+            self._rate_constants.mark_changed(changes)
+        self._rate_constants.apply(rates)
+
+    @property
+    def step_rate(self):
+        """KMC steps per second measured by the run loop."""
+        return self._step_stats[0]
+
+    @property
+    def batch_size(self):
+        """Steps per frame currently chosen by the run loop."""
+        return int(self._step_stats[1])
+
+    def create_frame_buffer(self, slots=64):
+        """
+        Allocates a shared memory ring buffer sized for this model, which the run loop
+        then writes its frames to instead of putting them on the image queue.
+        """
+        _, config, tofs, occs = self._get_single_dynamic_data(state=self.get_atoms(geometry=False))
+        self.frame_buffer = SharedFrameBuffer(config.size, len(tofs),
+                                              (len(occs), len(occs[0]["values"])), slots=slots,
+                                              stderr=self.ensemble is not None)
+        return self.frame_buffer
+
+    def _write_frame_buffer(self, single_data):
+        kmc_time, config, tofs, occs = single_data
+        self.frame_buffer.write(kmc_time, config, [tof["values"] for tof in tofs],
+                                [occ["values"] for occ in occs], *get_stderr(tofs, occs))
+
+    def request_keyframe(self):
+        """Makes the next delta encoded frame a keyframe."""
+        self._keyframe_requested.set()
+
     def _get_adsorbate_species(self):
         try:
             species = sorted(self.settings.representations)
@@ -110,7 +1318,7 @@ class WebGLInterface(KMC_Model):
 
     def _get_surface_species(self):
         try:
-            atoms = eval(self.settings.lattice_representation)[0]
+            atoms = eval_atoms(self.settings.lattice_representation)[0]
             surface = sorted(list(set(atoms.get_chemical_symbols())))
             logger.debug("Collected surface species tags.")
         except:
@@ -118,6 +1326,8 @@ class WebGLInterface(KMC_Model):
         return surface
 
     def _get_type_definition(self, atom_type, info=None):
+        import ase.data
+        import ase.data.colors
         try:
             rad = ase.data.covalent_radii[ase.data.atomic_numbers[atom_type]]
             col = ase.data.colors.jmol_colors[ase.data.atomic_numbers[atom_type]].tolist()
@@ -129,23 +1339,22 @@ class WebGLInterface(KMC_Model):
         return {'radius': rad, 'color': col, 'name': full, 'info': info}
 
     def _get_fixed_species(self):
-        atoms = eval(self.settings.lattice_representation)[0]
+        atoms = eval_atoms(self.settings.lattice_representation)[0]
         size = self.lattice.system_size
         atoms = atoms.repeat(size)
         fixed_species = self._get_coords_and_tags(atoms)
         return fixed_species
 
+    def _get_site_positions(self):
+        # x slowest, as the sites of the config
+        grid = np.meshgrid(*[np.arange(0, n) for n in self.lattice.system_size], indexing='ij')
+        grid = np.column_stack([_.ravel() for _ in grid])
+        cell_offsets = np.dot(grid, self.lattice.unit_cell_size)
+        site_offsets = np.dot(self.lattice.site_positions, self.lattice.unit_cell_size)
+        return (site_offsets[np.newaxis] + cell_offsets[:, np.newaxis]).reshape(-1, 3)
+
     def _get_sites(self):
-        grid = np.meshgrid(*[np.arange(0, n) for n in self.lattice.system_size])
-        grid = list(zip(*(_.flat for _ in grid)))
-        sites = []
-        for i in grid:
-            for s in self.lattice.site_positions:
-                site = list(
-                    np.dot(s, self.lattice.unit_cell_size) +
-                    np.dot(i, self.lattice.unit_cell_size))
-                sites.append({"x": site[0], "y": site[1], "z": site[2]})
-        return sites
+        return [{"x": x, "y": y, "z": z} for x, y, z in self._get_site_positions().tolist()]
 
     def _get_coords(self, atoms):
         coords = []
@@ -177,11 +1386,13 @@ class WebGLInterface(KMC_Model):
                 )
         return adjustable_params
 
-    def _get_params(self):
+    def _get_params(self, parameters=None):
+        if parameters is None:
+            parameters = self.settings.parameters
         params = []
-        for param in sorted(self.settings.parameters):
-            if self.settings.parameters[param]['adjustable']:
-                sett = self.settings.parameters[param]
+        for param in sorted(parameters):
+            if parameters[param]['adjustable']:
+                sett = parameters[param]
                 params.append(
                     {
                         "value": sett['value'],
@@ -190,6 +1401,58 @@ class WebGLInterface(KMC_Model):
                 )
         return params
 
+    def get_initial_arrays(self):
+        return self.initial_payload.arrays
+
+    def get_initial_data_key(self):
+        """
+        Cache key of the initial data: model name, lattice size and a hash of the
+        format version, the settings module, the current parameters and the compiled model file.
+        """
+        digest = hashlib.sha256(f'initial-data-{INITIAL_DATA_VERSION}'.encode())
+        with open(self.settings.__file__, 'rb') as settings_file:
+            digest.update(settings_file.read())
+        digest.update(json.dumps(self.settings.parameters, sort_keys=True, default=str).encode())
+        model_stat = os.stat(kmc_model.__file__)
+        digest.update(f'{model_stat.st_size}:{model_stat.st_mtime_ns}'.encode())
+        size = 'x'.join(str(int(n)) for n in self.lattice.system_size)
+        return f'{self.system_name}-{size}-{digest.hexdigest()[:16]}'
+
+    def _load_initial_payload(self, cache_dir=None):
+        """
+        Return the InitialPayload of this model from the in-memory cache, the
+        on-disk cache in cache_dir, or build it (and store it in both caches).
+        """
+        key = self.get_initial_data_key()
+        payload = INITIAL_PAYLOADS.get(key)
+        path = os.path.join(cache_dir, key + '.json') if cache_dir else None
+        if payload is None and path and os.path.exists(path) and os.path.exists(path + '.gz'):
+            with open(path, 'rb') as json_file, open(path + '.gz', 'rb') as gzip_file:
+                payload = InitialPayload(key, json_file.read(), gzip_file.read())
+            logger.info('Loaded initial data from %s', path)
+        if payload is None:
+            payload = InitialPayload(key, dumps_json(self._get_initial_data()).encode())
+            if path:
+                self._write_initial_cache(path, payload)
+        else:
+            for entry in payload.data["plots"]["plotData"]:
+                self.plot_history.append(entry["kmcTime"],
+                                         [tof["values"] for tof in entry["tof"]],
+                                         [occ["values"] for occ in entry["coverage"]])
+        INITIAL_PAYLOADS[key] = payload
+        return payload
+
+    @staticmethod
+    def _write_initial_cache(path, payload):
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            for file_path, content in ((path, payload.json), (path + '.gz', payload.gzip)):
+                with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as tmp:
+                    tmp.write(content)
+                os.replace(tmp.name, file_path)
+        except OSError as exc:
+            logger.warning('Cannot write initial data cache %s: %s', path, exc)
+
     def _get_initial_data(self):
         initial_data_format_json = {
             "visualization": {
@@ -204,16 +1467,17 @@ class WebGLInterface(KMC_Model):
                 "coverage": [],
             }
         }
-        state = self.get_atoms()
+        state = self.get_atoms(geometry=False)
         species = self._get_adsorbate_species()
         surface = self._get_surface_species()
-        _cov_colors = [list(matplotlib.colors.to_rgb(c)) for c in cm.tab10.colors]
-        _tof_colors = [list(matplotlib.colors.to_rgb(c)) for c in cm.Accent.colors]
+        _cov_colors = [hex2rgb(c) for c in COVERAGE_COLORS]
+        _tof_colors = [hex2rgb(c) for c in TOF_COLORS]
+        import ase.formula
         atom_types = []
         for n, spec in enumerate(species):
             try:
                 atom_types.extend(list(ase.formula.Formula(spec).count().keys()))
-                spec_atoms = eval(self.settings.representations[spec])
+                spec_atoms = eval_atoms(self.settings.representations[spec])
                 initial_data_format_json["visualization"]["species"].append(
                     self._get_coords_and_tags(spec_atoms))
             except:
@@ -248,76 +1512,571 @@ class WebGLInterface(KMC_Model):
         )
         return initial_data_format_json
 
-    def _get_single_dynamic_data(self, state=None):
+    def _get_lattice_species(self):
+        """
+        Return the species index of every lattice site as a flat uint8 array,
+        ordered x, y, z, site (the order of the visualization config).
+
+        kmcos keeps the lattice array of the Fortran base module private, f2py only
+        exports get_species, so this is still one Fortran call per site (without the
+        coordinate conversions and Python lists of the per-site loop it replaced).
+        """
+        size_x, size_y, size_z = (int(n) for n in self.lattice.system_size)
+        spuck = int(self.lattice.spuck)
+        volume = size_x * size_y * size_z * spuck
+        species = np.fromiter(map(self.base.get_species, range(1, volume + 1)),
+                              dtype=np.uint8, count=volume)
+        # Fortran site numbers (calculate_lattice2nr) run site fastest, then x, then y,
+        # the config runs x slowest and site fastest
+        return species.reshape(size_z, size_y, size_x, spuck).transpose(2, 1, 0, 3).ravel()
+
+    def _get_tof_values(self):
+        tof_values = np.column_stack((self.tof_data, self.tof_integ))
+        tof_values[np.isnan(tof_values)] = 0.0
+        return tof_values
+
+    def _get_single_dynamic_data(self, state=None, summary=False):
         if not state:
-            state = self.get_atoms()
+            state = self.get_atoms(geometry=False)
         kmc_time = state.kmc_time
-        config = []
-        tofs = []
-        occs = []
-        for x_coord in range(self.lattice.system_size[0]):
-            for y_coord in range(self.lattice.system_size[1]):
-                for z_coord in range(self.lattice.system_size[2]):
-                    for sites_per_unit_cell in range(1, 1 + self.lattice.spuck):
-                        config.append(
-                            self.lattice.get_species(
-                                [x_coord, y_coord, z_coord, sites_per_unit_cell]))
-        for tof in zip(self.tof_data.tolist(), self.tof_integ.tolist()):
-            _tof = []
-            for t in tof:
-                if np.isnan(t):
-                    _tof.append(0.0)
-                else:
-                    _tof.append(float(t))
-            tofs.append(
-                {"values": _tof}
-            )
-        for occ in state.occupation.tolist():
-            occs.append(
-                {"values": occ}
-            )
+        config = None if summary else self._get_lattice_species()
+        tofs = [{"values": tof} for tof in self._get_tof_values()]
+        occs = [{"values": occ} for occ in np.asarray(state.occupation, dtype=np.float64)]
         return kmc_time, config, tofs, occs
 
-    def _get_dynamic_data(self, history_lenght=30, state=None, slider=False):
-        if not state:
-            state = self.get_atoms()
-        kmc_time, config, tofs, occs = self._get_single_dynamic_data(state=state)
-        dynamic_data_format_json = {
-            "visualization": {
-                "config": config
-            },
-            "plots": {}
+    def _append_plot_history(self, single_data):
+        kmc_time, config, tofs, occs = single_data
+        self.plot_history.append(kmc_time, [tof["values"] for tof in tofs],
+                                 [occ["values"] for occ in occs], *get_stderr(tofs, occs))
+
+    def _get_dynamic_data(self, history_length=None, state=None, slider=False, delta=False,
+                          single_data=None):
+        """
+        The frame of the current state, added to the plot history; with the given
+        single_data (of _send_frame) the frame of it, already in the plot history.
+        """
+        if not single_data:
+            single_data = self._get_single_dynamic_data(state=state)
+            self._append_plot_history(single_data)
+        kmc_time, config, tofs, occs = single_data
+        history_length = history_length or self.plot_window
+        if delta:
+            dynamic_data_format_json = self._get_delta_frame(config, history_length)
+        else:
+            dynamic_data_format_json = {
+                "visualization": {
+                    "config": config
+                },
+                "plots": {
+                    "plotData": self.plot_history.plot_data(history_length)
+                }
             }
-        self._history.append({
-            "kmcTime": kmc_time,
-            "tof": tofs,
-            "coverage": occs
-        })
-        if len(self._history) == history_lenght+1:
-            self._history.pop(0)
-        dynamic_data_format_json["plots"]["plotData"] = \
-            self._history
         if slider:
             dynamic_data_format_json["sliderData"] = self._get_params()
         return dynamic_data_format_json
 
+    def _get_summary_frame(self, history_length=None):
+        """
+        Frame of a fast-forward without the lattice: the plot history, the slider
+        data and the progress of the fast-forward as `fastForward`.
+        """
+        return {
+            "plots": {
+                "plotData": self.plot_history.plot_data(history_length or self.plot_window)
+            },
+            "sliderData": self._get_params(),
+            "fastForward": self.fast_forward,
+        }
+
+    def _get_delta_frame(self, config, history_length):
+        """
+        Every `keyframe_interval` frames (or on request) a keyframe holds the full
+        config and plot history, all frames in between only hold the
+        [site_index, new_species] pairs and the newest plot history entry.
+        """
+        self._frame_sequence += 1
+        keyframe = (self._last_config is None or self._keyframe_requested.is_set() or
+                    self._frames_since_keyframe + 1 >= self.keyframe_interval)
+        if keyframe:
+            self._keyframe_requested.clear()
+            self._frames_since_keyframe = 0
+            visualization = {"config": config}
+            plot_data = self.plot_history.plot_data(history_length)
+        else:
+            self._frames_since_keyframe += 1
+            changed_sites = np.flatnonzero(config != self._last_config)
+            visualization = {
+                "changes": np.column_stack((changed_sites, config[changed_sites])).astype(np.int32)
+            }
+            plot_data = self.plot_history.plot_data(1)
+        self._last_config = config
+        return {
+            "sequence": self._frame_sequence,
+            "keyframe": keyframe,
+            "historyLength": history_length,
+            "visualization": visualization,
+            "plots": {
+                "plotData": plot_data
+            }
+        }
+
+class TrajectoryReplay(WebGLInterface):
+    """
+    Plays a recording of TrajectoryRecorder instead of running KMC steps: the run
+    loop sends the recorded frames, with the recorded parameter values as slider
+    data, at `speed` times the pace of the recording (pauses in the recording
+    shortened to `max_gap` seconds) and starts over at its end or on reset.
+    /initial serves the recorded initial data, slider updates are ignored.
+    """
+    def __init__(self, recording, speed=1.0, max_gap=1.0, **options):
+        self.trajectory = TrajectoryReader(recording)
+        self.speed = speed
+        self.max_gap = max_gap
+        options.update(size=self.trajectory.meta['size'], record=None, snapshot=None, replicas=1)
+        super().__init__(**options)
+        logger.info('Replaying %d frames of %s', len(self.trajectory), recording)
+
+    def _load_initial_payload(self, cache_dir=None):
+        return InitialPayload(self.trajectory.meta['key'], self.trajectory.initial_json)
+
+    def _rewind(self):
+        self.plot_history.clear()
+        self._last_config = None
+        self._keyframe_requested.set()
+        self._position = 0
+
+    def _send_recorded_frame(self):
+        """Send the recorded frame at the current position, return its recorded time."""
+        recorded_time, kmc_time, species, tof, occupation = self.trajectory.frame(self._position)
+        for label, value in self.trajectory.parameters(self._position).items():
+            if label in settings.parameters:
+                settings.parameters[label]['value'] = value
+        self._send_frame((kmc_time, species, [{"values": values} for values in tof],
+                          [{"values": values} for values in occupation]))
+        self._position += 1
+        return recorded_time
+
+    def run(self):
+        self._start_process()
+        if not len(self.trajectory):
+            logger.warning('Recording %s has no frames', self.trajectory.path)
+            return
+        self._rewind()
+        due = time.monotonic()
+        while True:
+            if self.paused:
+                while self.paused:
+                    self._handle_signal(self.signal_queue.get())
+                due = time.monotonic()
+            while self.signal_queue is not None and not self.signal_queue.empty():
+                self._handle_signal(self.signal_queue.get())
+            while not self.parameter_queue.empty():
+                self.parameter_queue.get()
+            if self._position >= len(self.trajectory):
+                self._rewind()
+            recorded_time = self._send_recorded_frame()
+            if self._position < len(self.trajectory):
+                gap = self.trajectory.frame(self._position)[0] - recorded_time
+                due += min(max(gap, 0.0), self.max_gap) / self.speed
+            time.sleep(max(due - time.monotonic(), 0))
+
+    def _handle_signal(self, message):
+        name = message[0] if isinstance(message, tuple) else message
+        if name == 'COMMAND':
+            name = self._handle_signal(message[2])
+            self._acknowledge(message[1], None if name else 'Not supported while replaying')
+        elif name == 'RESET':
+            for label, parameter in self.default_params.items():
+                settings.parameters[label]['value'] = parameter['value']
+            # from the start of the recording, before the acknowledgement
+            self._rewind()
+            self._send_recorded_frame()
+        elif name in ('PAUSE', 'RESUME', 'PROFILE'):
+            super()._handle_signal(message)
+        else:
+            logger.warning('Signal %r is not supported while replaying', message)
+            return None
+        return name
+
+class CachedFrame:
+    """A frame with its payloads, every encoder serializes the frame only once."""
+    def __init__(self, frame_id, frame):
+        self.frame_id = frame_id
+        self.frame = frame
+        self._payloads = {}
+        self._lock = threading.Lock()
+
+    def encode(self, encoder):
+        with self._lock:
+            if encoder not in self._payloads:
+                self._payloads[encoder] = encoder(self.frame)
+            return self._payloads[encoder]
+
+class FrameBroadcaster:
+    """
+    Drains the frame queue of the simulation process in a background thread and
+    keeps the most recent frames with their frame number of the simulation process
+    as frame id, so any number of readers can wait for frames without taking them
+    from each other.
+    """
+    def __init__(self, frame_queue, buffer_size=100):
+        self._frame_queue = frame_queue
+        self._frames = deque(maxlen=buffer_size)
+        self._frame_id = 0
+        # frames before it are dropped (of the state before a reset)
+        self._first_id = 0
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._drain, name='frame-drain', daemon=True)
+            self._thread.start()
+
+    def _drain(self):
+        while True:
+            item = self._frame_queue.get()
+            if item is None:
+                return
+            frame_id, frame = item
+            with self._condition:
+                self._frame_id = frame_id
+                if frame_id >= self._first_id:
+                    self._frames.append(CachedFrame(frame_id, frame))
+                    self._condition.notify_all()
+
+    @property
+    def frame_id(self):
+        return self._frame_id
+
+    def _newest_id(self):
+        return self._frames[-1].frame_id if self._frames else 0
+
+    def clear(self, first_id):
+        """Serve only the frames from first_id on, e.g. the frame of a reset."""
+        with self._condition:
+            self._first_id = first_id
+            while self._frames and self._frames[0].frame_id < first_id:
+                self._frames.popleft()
+
+    def close(self):
+        """Stops the drain thread, the simulation process has to be stopped before."""
+        if self._thread is not None:
+            self._frame_queue.put(None)
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def get_after(self, encoder, after_id=0, timeout=None):
+        """
+        Return the frame following after_id (the oldest buffered frame newer than
+        after_id) as (frame_id, encoder(frame)), blocks until there is one.
+        Returns (None, None) on timeout.
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._newest_id() > after_id, timeout):
+                return None, None
+            cached = next(cached for cached in self._frames if cached.frame_id > after_id)
+        return cached.frame_id, cached.encode(encoder)
+
+    def get_latest(self, encoder, after_id=0, timeout=None):
+        """
+        Return the newest frame as (frame_id, encoder(frame)) once it is newer than
+        after_id, frames in between are skipped. Returns (None, None) on timeout.
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._newest_id() > after_id, timeout):
+                return None, None
+            cached = self._frames[-1]
+        return cached.frame_id, cached.encode(encoder)
+
+def create_frame_source(kmc_model, image_queue, keyframe_interval=None, shared_frames=False,
+                        slider_data=None):
+    """
+    Return the frame source of the HTTP handlers for kmc_model, a SharedFrameReader
+    if shared_frames is set, else a FrameBroadcaster of the image queue.
+    """
+    if shared_frames:
+        return SharedFrameReader(kmc_model.create_frame_buffer(),
+                                 slider_data or kmc_model._get_params,
+                                 history_length=kmc_model.plot_window,
+                                 keyframe_interval=keyframe_interval,
+                                 fast_forward=lambda: kmc_model.fast_forward)
+    return FrameBroadcaster(image_queue)
+
+class FrameWaiter:
+    """
+    Lets coroutines wait for new frames of a frame source without a thread each:
+    while any coroutine waits, a single task polls the frame id and wakes them all.
+    """
+    def __init__(self, frames, poll_interval=0.005):
+        self._frames = frames
+        self._poll_interval = poll_interval
+        self._condition = asyncio.Condition()
+        self._waiting = 0
+        self._poller = None
+
+    async def _poll(self):
+        frame_id = self._frames.frame_id
+        while self._waiting:
+            await asyncio.sleep(self._poll_interval)
+            if self._frames.frame_id != frame_id:
+                frame_id = self._frames.frame_id
+                async with self._condition:
+                    self._condition.notify_all()
+        self._poller = None
+
+    async def wait(self, after_id, timeout):
+        """Wait until the frame id is above after_id, return False on timeout."""
+        if self._frames.frame_id > after_id:
+            return True
+        self._waiting += 1
+        if self._poller is None:
+            self._poller = asyncio.ensure_future(self._poll())
+        try:
+            async with self._condition:
+                await asyncio.wait_for(
+                    self._condition.wait_for(lambda: self._frames.frame_id > after_id), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._waiting -= 1
+
+    async def _get(self, get_frame, timeout):
+        """
+        Call get_frame(timeout=0) in an executor (it encodes the frame) until it
+        returns a frame, waiting for the next frame id in between.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            after_id = self._frames.frame_id
+            frame_id, payload = await loop.run_in_executor(None, get_frame, 0)
+            if frame_id is not None:
+                return frame_id, payload
+            if not await self.wait(after_id, deadline - loop.time()):
+                return None, None
+
+    async def get_after(self, encoder, after_id, timeout):
+        """Awaitable get_after of the frame source."""
+        return await self._get(
+            lambda no_wait: self._frames.get_after(encoder, after_id, no_wait), timeout)
+
+    async def get_latest(self, encoder, after_id, timeout):
+        """Awaitable get_latest of the frame source."""
+        return await self._get(
+            lambda no_wait: self._frames.get_latest(encoder, after_id, no_wait), timeout)
+
+def get_frame_reader(sim, frames):
+    """
+    Return the method of frames (the frame source of sim or its FrameWaiter) that
+    serves the frame after a reader's frame id: delta encoded frames are useless
+    without their predecessor, so they are read in order, full frames skip to the newest.
+    """
+    return frames.get_after if sim.kmc_model.keyframe_interval else frames.get_latest
+
+def get_frame_encoder(sim, encoder, view=None):
+    """Return encoder of the FrameView view (if any), timed by the frame_encode_seconds of sim."""
+    return sim.kmc_model.timed_encoder(view.encoder(encoder) if view else encoder)
+
+class SimulationSession:
+    """
+    One simulation of a SimulationPool with its own KMC process, queues, frame source
+    and parameter set. Has the attributes of FlaskWrapper used by the route handlers.
+    """
+    def __init__(self, session_id, steps_per_frame, keyframe_interval=None,
+                 shared_frames=False, scheduler=None, initial_cache_dir=None, history_length=30,
+                 plot_window=30, rate_table=None, snapshot=None, size=None, acceleration=None,
+                 replicas=1):
+        self.session_id = session_id
+        self.parameters = copy.deepcopy(DEFAULT_PARAMETERS)
+        image_queue = multiprocessing.Queue(maxsize=100)
+        self.kmc_model = WebGLInterface(image_queue=image_queue,
+                                        parameter_queue=multiprocessing.Queue(maxsize=10),
+                                        signal_queue=multiprocessing.Queue(maxsize=10),
+                                        steps_per_frame=steps_per_frame,
+                                        keyframe_interval=keyframe_interval,
+                                        scheduler=scheduler,
+                                        initial_cache_dir=initial_cache_dir,
+                                        history_length=history_length, plot_window=plot_window,
+                                        rate_table=rate_table, snapshot=snapshot, size=size,
+                                        replicas=replicas, banner=False, **(acceleration or {}))
+        self.kmc_model.daemon = True
+        self.startup_phases = self.kmc_model.init_phases
+        with timed(self.startup_phases, 'frameSource'):
+            self.frames = create_frame_source(
+                self.kmc_model, image_queue, keyframe_interval, shared_frames,
+                slider_data=lambda: self.kmc_model._get_params(self.parameters))
+        self.simulation_running = False
+        self.last_used = time.monotonic()
+
+    def start_simulation(self):
+        self.kmc_model.start()
+        self.frames.start()
+        self.simulation_running = True
+
+    @property
+    def idle_seconds(self):
+        return time.monotonic() - self.last_used
+
+    def close(self):
+        if self.kmc_model.pid:
+            self.kmc_model.kill()
+            self.kmc_model.join()
+        self.frames.close()
+        self.simulation_running = False
+
+class SimulationPool:
+    """
+    Runs up to max_sessions simulations side by side, each in its own process.
+
+    The Fortran model state is global per process, so a session is created and
+    started (forked) under a lock while its lattice is the allocated one, and the
+    lattice is deallocated in the server process afterwards. The lattice of the
+    main simulation in the server process is deallocated for it too, if the main
+    simulation was not started yet its process allocates a new one (run). When the pool is full,
+    the least recently used session idle for at least idle_timeout seconds is evicted.
+    """
+    def __init__(self, max_sessions, idle_timeout=60, **session_options):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._session_options = session_options
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    @property
+    def sessions(self):
+        return list(self._sessions.values())
+
+    def _evict(self):
+        for session_id, session in self._sessions.items():
+            if session.idle_seconds >= self.idle_timeout:
+                logger.info('Evicting idle session %s', session_id)
+                self._sessions.pop(session_id).close()
+                return True
+        return False
+
+    def create(self, size=None):
+        """
+        Return a new started session (with the lattice size instead of the one of
+        the session options if given), None if all sessions are in use.
+        """
+        with self._lock:
+            if len(self._sessions) >= self.max_sessions and not self._evict():
+                return None
+            options = dict(self._session_options)
+            if size is not None:
+                options['size'] = size
+            if options.get('scheduler') is not None:
+                options['scheduler'] = copy.copy(options['scheduler'])
+            if base.is_allocated():
+                lattice.deallocate_system()
+            session = SimulationSession(uuid.uuid4().hex, **options)
+            session.start_simulation()
+            session.kmc_model.deallocate()
+            self._sessions[session.session_id] = session
+            return session
+
+    def get(self, session_id):
+        """Return the session and mark it as used, None if there is no such session."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_used = time.monotonic()
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def remove(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None:
+            session.close()
+        return session is not None
+
+    def close(self):
+        with self._lock:
+            while self._sessions:
+                self._sessions.popitem()[1].close()
+
 class FlaskWrapper(Flask):
     def __init__(self, import_name, image_queue, parameter_queue, signal_queue, steps_per_frame,
+                 keyframe_interval=None, shared_frames=False, scheduler=None,
+                 initial_cache_dir=None, history_length=30, plot_window=30, rate_table=None,
+                 snapshot=None, record=None, replay=None, replay_speed=1.0, size=None,
+                 acceleration=None, replicas=1, background_init=False, frame_timeout=10,
                  static_url_path=None, static_folder="static", static_host=None,
                  host_matching=False, subdomain_matching=False, template_folder="templates",
                  instance_path=None, instance_relative_config=False, root_path=None):
         super().__init__(import_name, static_url_path, static_folder, static_host, host_matching,
                          subdomain_matching, template_folder, instance_path,
                          instance_relative_config, root_path)
-        self.kmc_model = WebGLInterface(image_queue=image_queue,
-                                        parameter_queue=parameter_queue,
-                                        signal_queue=signal_queue,
-                                        steps_per_frame=steps_per_frame, banner=False)
-        self.kmc_model.daemon = True
+        self._created = time.perf_counter()
+        self._model_options = dict(image_queue=image_queue,
+                                   parameter_queue=parameter_queue,
+                                   signal_queue=signal_queue,
+                                   steps_per_frame=steps_per_frame,
+                                   keyframe_interval=keyframe_interval,
+                                   scheduler=scheduler,
+                                   initial_cache_dir=initial_cache_dir,
+                                   history_length=history_length, plot_window=plot_window,
+                                   rate_table=rate_table, snapshot=snapshot, record=record,
+                                   size=size, replicas=replicas, banner=False,
+                                   **(acceleration or {}))
+        # recording played instead of the simulation
+        self._replay = dict(recording=replay, speed=replay_speed) if replay else None
+        self._shared_frames = shared_frames
+        # seconds a /dynamic request waits for the next frame
+        self.frame_timeout = frame_timeout
+        self.http_metrics = Metrics()
+        self.kmc_model = None
+        self.frames = None
+        self.pool = None
         self._simulation_running = False
+        # slider values of the simulation, settings.parameters of the server process stay
+        # the defaults the sessions are created with
+        self._parameters = copy.deepcopy(DEFAULT_PARAMETERS)
+        # set once kmc_model and frames exist, with background_init after the server is up
+        self.ready = threading.Event()
+        self.startup_phases = {}
+        self.startup_error = None
+        if background_init:
+            threading.Thread(target=self._initialize_in_background, daemon=True).start()
+        else:
+            self.initialize()
+
+    def initialize(self):
+        """Build the model and its frame source."""
+        options = self._model_options
+        if self._replay:
+            kmc_model = TrajectoryReplay(**self._replay, **options)
+        else:
+            kmc_model = WebGLInterface(**options)
+        kmc_model.daemon = True
+        self.startup_phases.update(kmc_model.init_phases)
+        with timed(self.startup_phases, 'frameSource'):
+            frames = create_frame_source(kmc_model, options['image_queue'],
+                                         options['keyframe_interval'], self._shared_frames,
+                                         slider_data=lambda: kmc_model._get_params(self.parameters))
+        if self._shared_frames:
+            atexit.register(frames.close)
+        self.kmc_model, self.frames = kmc_model, frames
+        self.startup_phases['ready'] = time.perf_counter() - self._created
+        self.ready.set()
+
+    def _initialize_in_background(self):
+        try:
+            self.initialize()
+        except Exception as exc:
+            logger.exception('Simulation failed to initialize')
+            self.startup_error = str(exc)
 
     def start_simulation(self):
         self.kmc_model.start()
+        self.frames.start()
         self._simulation_running = True
 
     @property
@@ -328,84 +2087,449 @@ class FlaskWrapper(Flask):
     def simulation_running(self, value: bool):
         self._simulation_running = value
 
-if __name__ == "__main__":
-    import multiprocessing
+    @property
+    def parameters(self):
+        return self._parameters
+
+    def get_simulation(self, session_id=None):
+        """Return the pool session of session_id (None if unknown), the app itself if None."""
+        if session_id is None:
+            return self
+        return self.pool.get(session_id) if self.pool is not None else None
+
+def create_app():
+    """
+    Return the Flask app of the simulation service with the routes registered,
+    configured by the SIMULATION_* environment variables.
+    """
     pq = multiprocessing.Queue(maxsize=10)
-    sq = multiprocessing.Queue(maxsize=1)
+    sq = multiprocessing.Queue(maxsize=10)
     iq = multiprocessing.Queue(maxsize=100)
     spf = int(1e5)
+    kfi = int(os.environ.get('SIMULATION_KEYFRAME_INTERVAL') or 0) or None
+    shm = os.environ.get('SIMULATION_SHARED_MEMORY') == '1'
+    scheduler = StepScheduler(
+        spf,
+        mode=os.environ.get('SIMULATION_STEP_MODE') or 'fixed',
+        frame_budget=float(os.environ.get('SIMULATION_FRAME_BUDGET') or 1./33),
+        kmc_time_per_frame=float(os.environ.get('SIMULATION_KMC_TIME_PER_FRAME') or 0) or None)
+    cache_dir = os.environ.get('SIMULATION_CACHE_DIR') or None
+    history_length = int(os.environ.get('SIMULATION_HISTORY_LENGTH') or 30)
+    plot_window = int(os.environ.get('SIMULATION_PLOT_WINDOW') or 30)
+    rate_table = os.environ.get('SIMULATION_RATE_TABLE') or None
+    snapshot = os.environ.get('SIMULATION_SNAPSHOT') or None
+    replay = os.environ.get('SIMULATION_REPLAY') or None
+    size = parse_size(os.environ.get('SIMULATION_SIZE'))
+    # largest lattice size per dimension a session can ask for
+    max_size = int(os.environ.get('SIMULATION_MAX_SIZE') or 200)
+    # kmcos temporal acceleration, the parameters left at None keep the values of the model
+    acceleration = dict(
+        accelerate=os.environ.get('SIMULATION_ACCELERATION') == '1',
+        buffer_parameter=int(os.environ.get('SIMULATION_ACC_BUFFER') or 0) or None,
+        threshold_parameter=float(os.environ.get('SIMULATION_ACC_THRESHOLD') or 0) or None,
+        sampling_steps=int(os.environ.get('SIMULATION_ACC_SAMPLING_STEPS') or 0) or None,
+        execution_steps=int(os.environ.get('SIMULATION_ACC_EXECUTION_STEPS') or 0) or None,
+        save_limit=int(os.environ.get('SIMULATION_ACC_SAVE_LIMIT') or 0) or None)
+    # simulations averaged for the TOFs and coverages of the frames
+    replicas = int(os.environ.get('SIMULATION_REPLICAS') or 1)
+    # longest wall-clock seconds of a fast-forward
+    max_fast_forward = float(os.environ.get('SIMULATION_MAX_FAST_FORWARD') or 60)
     app = FlaskWrapper(import_name=__name__,
                        image_queue=iq,
                        parameter_queue=pq,
                        signal_queue=sq,
-                       steps_per_frame=spf)
+                       steps_per_frame=spf,
+                       keyframe_interval=kfi,
+                       shared_frames=shm,
+                       scheduler=scheduler,
+                       initial_cache_dir=cache_dir,
+                       history_length=history_length,
+                       plot_window=plot_window,
+                       rate_table=rate_table,
+                       snapshot=snapshot,
+                       record=None if replay else os.environ.get('SIMULATION_RECORD') or None,
+                       replay=replay,
+                       replay_speed=float(os.environ.get('SIMULATION_REPLAY_SPEED') or 1),
+                       size=size,
+                       acceleration=acceleration,
+                       replicas=replicas,
+                       background_init=os.environ.get('SIMULATION_FAST_START') == '1',
+                       frame_timeout=float(os.environ.get('SIMULATION_FRAME_TIMEOUT') or 10))
+    max_sessions = int(os.environ.get('SIMULATION_MAX_SESSIONS') or 0)
+    if max_sessions:
+        app.pool = SimulationPool(
+            max_sessions,
+            idle_timeout=float(os.environ.get('SIMULATION_SESSION_IDLE_TIMEOUT') or 60),
+            steps_per_frame=spf, keyframe_interval=kfi, shared_frames=shm, scheduler=scheduler,
+            initial_cache_dir=cache_dir, history_length=history_length, plot_window=plot_window,
+            rate_table=rate_table, snapshot=snapshot, size=size, acceleration=acceleration,
+            replicas=replicas)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def observe_request_time(response):
+        app.http_metrics.histogram('simulation_http_request_seconds',
+                                   'Seconds to handle a request (until the response starts)',
+                                   endpoint=request.endpoint or 'none').observe(
+            time.perf_counter() - g.request_start)
+        return response
+
+    @app.before_request
+    def check_ready():
+        """Until the model is initialized, only /health and /metrics answer."""
+        if not app.ready.is_set() and request.endpoint not in ('get_server_health', 'get_metrics'):
+            return jsonify(success=False, reason=app.startup_error or "Simulation is starting"), 503
+
+    def get_simulation(session_id):
+        """Return the pool session of session_id, the single simulation of the app if None."""
+        session = app.get_simulation(session_id)
+        if session is None:
+            response = jsonify(success=False, reason="Unknown session")
+            response.status_code = 404
+            abort(response)
+        return session
+
+    @app.route('/sessions', methods=['GET'])
+    def list_sessions():
+        sessions = app.pool.sessions if app.pool is not None else []
+        return jsonify(
+            success=True,
+            maxSessions=app.pool.max_sessions if app.pool is not None else 0,
+            sessions=[dict(sessionId=session.session_id,
+                           isPaused=not session.simulation_running,
+                           idleSeconds=session.idle_seconds) for session in sessions],
+        ), 200
+
+    @app.route('/sessions', methods=['POST'])
+    def create_session():
+        """Start a session, with the lattice `size` (e.g. 40 or [40, 30]) of the JSON body if given."""
+        if app.pool is None:
+            return jsonify(success=False, reason="Sessions are not enabled"), 400
+        data = request.get_json(silent=True) or {}
+        try:
+            size = parse_size(data.get('size'))
+        except (TypeError, ValueError):
+            return jsonify(success=False, reason="Size is not a positive integer or list of them"), 400
+        if isinstance(size, list) and len(size) != int(lattice.model_dimension):
+            return jsonify(success=False,
+                           reason=f"Size has not {int(lattice.model_dimension)} dimensions"), 400
+        if size is not None and max(np.atleast_1d(size)) > max_size:
+            return jsonify(success=False, reason=f"Size is above {max_size}"), 400
+        session = app.pool.create(size)
+        if session is None:
+            return jsonify(success=False, reason="All sessions are in use"), 503
+        return jsonify(success=True, sessionId=session.session_id), 201
+
+    @app.route('/sessions/<session_id>', methods=['DELETE'])
+    def delete_session(session_id):
+        if app.pool is None or not app.pool.remove(session_id):
+            return jsonify(success=False, reason="Unknown session"), 404
+        return jsonify(success=True), 200
 
     @app.route('/health', methods=['GET'])
-    def get_server_health():
+    @app.route('/sessions/<session_id>/health', methods=['GET'])
+    def get_server_health(session_id=None):
+        if not app.ready.is_set():
+            return jsonify(success=False, ready=False,
+                           reason=app.startup_error or "Simulation is starting",
+                           startup=app.startup_phases), 503
+        sim = get_simulation(session_id)
         return (
             jsonify(
                 success=True,
-                hasStarted=app.kmc_model.pid and app.simulation_running,
-                isPaused=app.kmc_model.pid and not app.simulation_running,
+                ready=True,
+                hasStarted=sim.kmc_model.pid and sim.simulation_running,
+                isPaused=sim.kmc_model.pid and not sim.simulation_running,
+                stepMode=sim.kmc_model.scheduler.mode,
+                stepRate=sim.kmc_model.step_rate,
+                stepsPerFrame=sim.kmc_model.batch_size,
+                latticeSize=list(sim.kmc_model.site_shape[:2]),
+                acceleration=sim.kmc_model.acceleration,
+                replicas=sim.kmc_model.ensemble.replicas if sim.kmc_model.ensemble else 1,
+                fastForward=sim.kmc_model.fast_forward,
+                startup=sim.startup_phases,
             ),
             200,
         )
 
+    @app.route('/metrics', methods=['GET'])
+    def get_metrics():
+        """Prometheus metrics of the server and of all simulations (sessions labelled)."""
+        registries = [({}, app.http_metrics)]
+        if app.ready.is_set():
+            registries.append(({}, app.kmc_model.metrics))
+        if app.pool is not None:
+            registries.extend(({'session': session.session_id}, session.kmc_model.metrics)
+                              for session in app.pool.sessions)
+        return Response(render_metrics(registries), mimetype='text/plain; version=0.0.4')
+
+    @app.route('/profile', methods=['GET'])
+    @app.route('/sessions/<session_id>/profile', methods=['GET'])
+    def get_profile(session_id=None):
+        """
+        Collapsed stacks of a sampling profile over `seconds` (default 5, at most 60)
+        of the simulation process, or of the HTTP server with `process=server`.
+        """
+        sim = get_simulation(session_id)
+        seconds = min(max(request.args.get('seconds', default=5.0, type=float), 0.1), 60.0)
+        if request.args.get('process') == 'server':
+            return Response(SamplingProfiler().run(seconds), mimetype='text/plain')
+        if not sim.simulation_running:
+            return jsonify(success=False, reason="Simulation is not running"), 400
+        profile = sim.kmc_model.profile(seconds)
+        if profile is None:
+            return jsonify(success=False, reason="Simulation did not answer"), 504
+        return Response(profile, mimetype='text/plain')
+
     @app.route('/start', methods=['POST'])
-    def start_simulation():
-        if not app.simulation_running and not app.kmc_model.pid:
-            app.start_simulation()
-            app._simulation_running = True
+    @app.route('/sessions/<session_id>/start', methods=['POST'])
+    def start_simulation(session_id=None):
+        sim = get_simulation(session_id)
+        if not sim.simulation_running and not sim.kmc_model.pid:
+            sim.start_simulation()
             return jsonify(success=True), 201
-        if app.simulation_running:
+        if sim.simulation_running and session_id is not None:
+            # sessions are started when they are created
+            return jsonify(success=True), 200
+        if sim.simulation_running:
             return jsonify(success=False), 200
         return jsonify(success=False), 400
 
+    def send_command(sim, command):
+        """Send a command to the run loop, the response with its acknowledgement."""
+        ack = sim.kmc_model.command(command)
+        if ack is None:
+            return None, (jsonify(success=False, reason="Simulation did not answer"), 504)
+        del ack['id']
+        if 'reason' in ack:
+            return None, (jsonify(success=False, **ack), 409)
+        return ack, (jsonify(success=True, **ack), 200)
+
     @app.route('/pause', methods=['PUT'])
-    def pause_simulation():
-        if app.simulation_running:
-            os.kill(app.kmc_model.pid, 19)
-            app._simulation_running = False
-            return jsonify(success=True), 200
-        if not app.simulation_running:
+    @app.route('/sessions/<session_id>/pause', methods=['PUT'])
+    def pause_simulation(session_id=None):
+        """Pause the run loop between two batches of steps, the last frame is still served."""
+        sim = get_simulation(session_id)
+        if sim.simulation_running:
+            ack, response = send_command(sim, 'PAUSE')
+            if ack is not None:
+                sim.simulation_running = False
+            return response
+        if not sim.simulation_running:
             return jsonify(success=False), 200
         return jsonify(success=False), 400
 
     @app.route('/resume', methods=['PUT'])
-    def resume_simulation():
-        if not app.simulation_running:
-            os.kill(app.kmc_model.pid, 18)
-            app._simulation_running = True
-            return jsonify(success=True), 200
-        if app.simulation_running:
+    @app.route('/sessions/<session_id>/resume', methods=['PUT'])
+    def resume_simulation(session_id=None):
+        sim = get_simulation(session_id)
+        if not sim.kmc_model.pid:
+            return jsonify(success=False, reason="Simulation has not started"), 400
+        if not sim.simulation_running:
+            ack, response = send_command(sim, 'RESUME')
+            if ack is not None:
+                sim.simulation_running = True
+            return response
+        if sim.simulation_running:
             return jsonify(success=False), 200
         return jsonify(success=False), 400
 
-    @app.route('/reset', methods=['POST'])
-    def reset_simulation():
+    @app.route('/step', methods=['POST'])
+    @app.route('/sessions/<session_id>/step', methods=['POST'])
+    def step_simulation(session_id=None):
+        """One batch of `steps` KMC steps (default the steps per frame) of the paused simulation."""
+        sim = get_simulation(session_id)
+        if not sim.kmc_model.pid or sim.simulation_running:
+            return jsonify(success=False, reason="Simulation is not paused"), 400
+        data = request.get_json(silent=True) or {}
         try:
-            app.kmc_model._history = []
-            while not app.kmc_model.dynamic_data.empty():
-                app.kmc_model.dynamic_data.get()
-            app.kmc_model.reset_simulation()
-            app.kmc_model.deallocate()
-            app.kmc_model.reset()
+            steps = int(data.get('steps') or 0)
+        except (TypeError, ValueError):
+            return jsonify(success=False, reason="Steps is not a number"), 400
+        if steps < 0:
+            return jsonify(success=False, reason="Steps is negative"), 400
+        return send_command(sim, ('STEP', steps))[1]
+
+    @app.route('/reset', methods=['POST'])
+    @app.route('/sessions/<session_id>/reset', methods=['POST'])
+    def reset_simulation(session_id=None):
+        """
+        Return to the default parameters and the reset snapshot if there is one, with
+        `{"to": "defaults"}` to an empty lattice.
+        """
+        sim = get_simulation(session_id)
+        target = (request.get_json(silent=True) or {}).get('to')
+        if target not in (None, 'snapshot', 'defaults'):
+            return jsonify(success=False, reason="Reset target is not snapshot or defaults"), 400
+        # drops the parameter changes the run loop did not apply yet
+        sim.kmc_model.reset_simulation(sim.parameters)
+        if not sim.kmc_model.pid:
             return jsonify(success=True), 201
-        except:
-            return jsonify(success=False), 400
+        ack, response = send_command(sim, ('RESET', target))
+        if ack is None:
+            return response
+        # the run loop cleared the plot history and sent the frame of the reset state
+        sim.frames.clear(ack['frameId'])
+        return jsonify(success=True, **ack), 201
+
+    @app.route('/snapshot', methods=['POST'])
+    @app.route('/sessions/<session_id>/snapshot', methods=['POST'])
+    def take_snapshot(session_id=None):
+        sim = get_simulation(session_id)
+        if isinstance(sim.kmc_model, TrajectoryReplay):
+            return jsonify(success=False, reason="Not supported while replaying"), 400
+        if not sim.simulation_running:
+            return jsonify(success=False, reason="Simulation is not running"), 400
+        if not sim.kmc_model.request_snapshot():
+            return jsonify(success=False, reason="Simulation did not answer"), 504
+        return jsonify(success=True), 201
+
+    @app.route('/fastforward', methods=['POST'])
+    @app.route('/sessions/<session_id>/fastforward', methods=['POST'])
+    def fast_forward_simulation(session_id=None):
+        """
+        Run the simulation without waiting for the frame rate until `kmcTime` seconds of
+        KMC time passed or after `seconds` of wall-clock time (at most `max_fast_forward`),
+        sending only every `frameInterval`-th frame; then it returns to real time.
+        """
+        sim = get_simulation(session_id)
+        if isinstance(sim.kmc_model, TrajectoryReplay):
+            return jsonify(success=False, reason="Not supported while replaying"), 400
+        if not sim.simulation_running:
+            return jsonify(success=False, reason="Simulation is not running"), 400
+        data = request.get_json(silent=True) or {}
+        try:
+            kmc_time = float(data['kmcTime']) if data.get('kmcTime') is not None else None
+            seconds = min(float(data.get('seconds') or max_fast_forward), max_fast_forward)
+            frame_interval = int(data.get('frameInterval') or 10)
+        except (TypeError, ValueError):
+            return jsonify(success=False, reason="kmcTime, seconds and frameInterval are not numbers"), 400
+        if (kmc_time is not None and kmc_time <= 0) or seconds <= 0 or frame_interval < 1:
+            return jsonify(success=False, reason="kmcTime, seconds and frameInterval are not positive"), 400
+        if not sim.kmc_model.request_fast_forward(kmc_time, seconds, frame_interval):
+            return jsonify(success=False, reason="Simulation did not answer"), 504
+        return jsonify(success=True), 201
+
+    @app.route('/fastforward', methods=['DELETE'])
+    @app.route('/sessions/<session_id>/fastforward', methods=['DELETE'])
+    def stop_fast_forward(session_id=None):
+        sim = get_simulation(session_id)
+        if not sim.kmc_model.fast_forward['active']:
+            return jsonify(success=False), 200
+        if not sim.kmc_model.request_fast_forward():
+            return jsonify(success=False, reason="Simulation did not answer"), 504
+        return jsonify(success=True), 200
+
+    def get_frame_encoding():
+        return get_frame_mimetype(request.accept_mimetypes)
 
     @app.route('/initial', methods=['GET'])
-    def get_initial_data():
-        return json.dumps(app.kmc_model.initial_data)
+    @app.route('/sessions/<session_id>/initial', methods=['GET'])
+    def get_initial_data(session_id=None):
+        sim = get_simulation(session_id)
+        mimetype = get_frame_encoding()
+        gzipped = 'gzip' in request.accept_encodings
+        payload, etag = sim.kmc_model.initial_payload.encode(mimetype, gzipped)
+        response = Response(payload, mimetype=mimetype)
+        response.set_etag(etag)
+        response.vary.update(('Accept', 'Accept-Encoding'))
+        if gzipped:
+            response.content_encoding = 'gzip'
+        return response.make_conditional(request)
+
+    @app.route('/history', methods=['GET'])
+    @app.route('/sessions/<session_id>/history', methods=['GET'])
+    def get_plot_history(session_id=None):
+        """
+        Plot history as columns, all kept entries or only the entries after the
+        sequence number `after` and/or the `last` entries.
+        """
+        sim = get_simulation(session_id)
+        after = request.args.get('after', type=int)
+        last = request.args.get('last', type=int)
+        window = sim.kmc_model.plot_history.get_window(after=after, last=last)
+        mimetype = get_frame_encoding()
+        return Response(FRAME_ENCODERS[mimetype](window), mimetype=mimetype)
 
     @app.route('/dynamic', methods=['GET'])
-    def get_dynamic_data():
-        if app.simulation_running:
-            return json.dumps(app.kmc_model.dynamic_data.get())
+    @app.route('/sessions/<session_id>/dynamic', methods=['GET'])
+    def get_dynamic_data(session_id=None):
+        """
+        The newest frame, or with `after` the first frame newer than that frame id
+        (blocks until there is one). The frame id is sent in the X-Frame-Id header.
+        `window` and/or `cell` select a level of detail (FrameView).
+        """
+        sim = get_simulation(session_id)
+        if sim.kmc_model.pid:
+            # also while paused, the newest frame is the last one before the pause
+            mimetype = get_frame_encoding()
+            try:
+                view = get_frame_view(sim.kmc_model, request.args)
+            except ValueError as exc:
+                return jsonify(success=False, reason=str(exc)), 400
+            after_id = request.args.get('after', 0, type=int)
+            if after_id > sim.frames.frame_id:
+                # frame id of a previous server run
+                after_id = 0
+            with sim.kmc_model.frame_get_seconds.time():
+                frame_id, payload = get_frame_reader(sim, sim.frames)(
+                    get_frame_encoder(sim, FRAME_ENCODERS[mimetype], view), after_id,
+                    app.frame_timeout)
+            if frame_id is None:
+                return jsonify(success=False, reason="No frame within the timeout"), 504
+            return Response(payload, mimetype=mimetype, headers={'X-Frame-Id': str(frame_id)})
         return jsonify(success=False), 400
 
+    @app.route('/stream', methods=['GET'])
+    @app.route('/sessions/<session_id>/stream', methods=['GET'])
+    def stream_dynamic_data(session_id=None):
+        """
+        Server-Sent Events stream of the dynamic data. Every event holds the newest
+        frame, a client that is slower than the simulation skips the frames in between
+        (unless they are delta encoded). `window` and/or `cell` select a level of detail.
+        """
+        sim = get_simulation(session_id)
+        if not sim.simulation_running:
+            return jsonify(success=False), 400
+        try:
+            view = get_frame_view(sim.kmc_model, request.args)
+        except ValueError as exc:
+            return jsonify(success=False, reason=str(exc)), 400
+
+        def events():
+            frame_id = max(sim.frames.frame_id - 1, 0)
+            encoder = get_frame_encoder(sim, dumps_json, view)
+            read_frame = get_frame_reader(sim, sim.frames)
+            while True:
+                next_frame_id, payload = read_frame(encoder, frame_id, timeout=15)
+                if next_frame_id is None:
+                    yield ': keepalive\n\n'
+                    continue
+                frame_id = next_frame_id
+                yield f'id: {frame_id}\ndata: {payload}\n\n'
+
+        return Response(events(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    @app.route('/keyframe', methods=['POST'])
+    @app.route('/sessions/<session_id>/keyframe', methods=['POST'])
+    def request_keyframe(session_id=None):
+        sim = get_simulation(session_id)
+        if not sim.kmc_model.keyframe_interval:
+            return jsonify(success=False, reason="Delta encoded frames are not enabled"), 400
+        if isinstance(sim.frames, SharedFrameReader):
+            sim.frames.request_keyframe()
+        else:
+            sim.kmc_model.request_keyframe()
+        return jsonify(success=True), 201
+
     @app.route('/slider', methods=['POST'])
-    def update_parameter():
+    @app.route('/sessions/<session_id>/slider', methods=['POST'])
+    def update_parameter(session_id=None):
+        sim = get_simulation(session_id)
         data = request.get_json()
         if not data:
           return jsonify(success=False, reason="JSON data cannot be read"), 400
@@ -423,20 +2547,132 @@ if __name__ == "__main__":
             value = float(value)
         except:
             return jsonify(success=False, reason="Value cannot be converted to Float"), 400
-        if label not in settings.parameters.keys():
+        if label not in sim.parameters.keys():
             return jsonify(success=False, reason="Label is not a parameter (key)"), 400
-        if not settings.parameters[label]["adjustable"]:
+        if not sim.parameters[label]["adjustable"]:
             return jsonify(success=False, reason="Parameter of label is not adjustable"), 400
-        vmin = float(settings.parameters[label]["min"])
-        vmax = float(settings.parameters[label]["max"])
+        vmin = float(sim.parameters[label]["min"])
+        vmax = float(sim.parameters[label]["max"])
         if value < vmin or value > vmax:
             return jsonify(success=False, reason="Value is below min or above max"), 400
-        settings.parameters[label]['value'] = str(value)
-        app.kmc_model.parameter_queue.put(settings.parameters)
+        sim.parameters[label]['value'] = str(value)
+        sim.kmc_model.parameter_updates.update(label, str(value))
         return jsonify(success=True), 201
 
+    return app
+
+FRAME_ROUTE = re.compile(r'(?:/sessions/(?P<session_id>[^/]+))?/(?P<route>dynamic|stream)')
+
+def create_asgi_app(app=None):
+    """
+    Return an ASGI app of the Flask app (create_app() if None). /dynamic and /stream
+    of running simulations wait for frames on the event loop, without a thread per
+    waiting request. All other requests are handled by the Flask app in a thread
+    pool, so /initial and /health never queue behind frame waits.
+    """
+    from asgiref.wsgi import WsgiToAsgi
+    from urllib.parse import parse_qsl
+    from werkzeug.datastructures import MIMEAccept, MultiDict
+    from werkzeug.http import parse_accept_header
+
+    app = app or create_app()
+    wsgi_app = WsgiToAsgi(app)
+    waiters = weakref.WeakKeyDictionary()
+
+    def get_waiter(frames):
+        if frames not in waiters:
+            waiters[frames] = FrameWaiter(frames)
+        return waiters[frames]
+
+    def request_args(scope):
+        return MultiDict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+
+    def observe_request_time(endpoint, start):
+        app.http_metrics.histogram('simulation_http_request_seconds',
+                                   'Seconds to handle a request (until the response starts)',
+                                   endpoint=endpoint).observe(time.perf_counter() - start)
+
+    async def get_dynamic_data(sim, view, scope, receive, send):
+        start = time.perf_counter()
+        accept = dict(scope['headers']).get(b'accept', b'').decode('latin-1')
+        mimetype = get_frame_mimetype(parse_accept_header(accept, MIMEAccept))
+        after_id = request_args(scope).get('after', 0, type=int)
+        if after_id > sim.frames.frame_id:
+            # frame id of a previous server run
+            after_id = 0
+        with sim.kmc_model.frame_get_seconds.time():
+            frame_id, payload = await get_frame_reader(sim, get_waiter(sim.frames))(
+                get_frame_encoder(sim, FRAME_ENCODERS[mimetype], view), after_id,
+                app.frame_timeout)
+        headers = [(b'content-type', mimetype.encode())]
+        if frame_id is None:
+            status = 504
+            headers = [(b'content-type', b'application/json')]
+            payload = dumps_json({"success": False, "reason": "No frame within the timeout"})
+        else:
+            status = 200
+            headers.append((b'x-frame-id', str(frame_id).encode()))
+        observe_request_time('get_dynamic_data', start)
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body',
+                    'body': payload.encode() if isinstance(payload, str) else payload})
+
+    async def stream_dynamic_data(sim, view, scope, receive, send):
+        async def wait_for_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        observe_request_time('stream_dynamic_data', time.perf_counter())
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no')]})
+        disconnected = asyncio.ensure_future(wait_for_disconnect())
+        frame_id = max(sim.frames.frame_id - 1, 0)
+        encoder = get_frame_encoder(sim, dumps_json, view)
+        read_frame = get_frame_reader(sim, get_waiter(sim.frames))
+        try:
+            while True:
+                latest = asyncio.ensure_future(read_frame(encoder, frame_id, 15))
+                await asyncio.wait((latest, disconnected), return_when=asyncio.FIRST_COMPLETED)
+                if disconnected.done():
+                    latest.cancel()
+                    return
+                next_frame_id, payload = latest.result()
+                if next_frame_id is None:
+                    event = ': keepalive\n\n'
+                else:
+                    frame_id = next_frame_id
+                    event = f'id: {frame_id}\ndata: {payload}\n\n'
+                await send({'type': 'http.response.body', 'body': event.encode(),
+                            'more_body': True})
+        finally:
+            disconnected.cancel()
+
+    handlers = {'dynamic': get_dynamic_data, 'stream': stream_dynamic_data}
+
+    async def asgi_app(scope, receive, send):
+        match = (scope['type'] == 'http' and scope['method'] == 'GET' and
+                 FRAME_ROUTE.fullmatch(scope['path']))
+        sim = app.get_simulation(match['session_id']) if match and app.ready.is_set() else None
+        try:
+            view = get_frame_view(sim.kmc_model, request_args(scope)) if sim else None
+        except ValueError:
+            sim = None
+        if sim is None or not sim.kmc_model.pid:
+            # the Flask app answers everything else, and the errors of the frame routes
+            return await wsgi_app(scope, receive, send)
+        await handlers[match['route']](sim, view, scope, receive, send)
+
+    asgi_app.flask_app = app
+    return asgi_app
+
+if __name__ == "__main__":
+    port = int(os.environ.get('SIMULATION_PORT', 3001))
     try:
-        port = int(os.environ.get('SIMULATION_PORT', 3001))
-        app.run(host='0.0.0.0', port=port)
+        if os.environ.get('SIMULATION_SERVER') == 'asgi':
+            import uvicorn
+            uvicorn.run(create_asgi_app(), host='0.0.0.0', port=port)
+        else:
+            create_app().run(host='0.0.0.0', port=port)
     except Exception as exc:
         print(exc)
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+"""
+Headless parameter sweep of a kmcos model: every point of the parameter grid
+is run to steady state in a process pool and its TOFs are appended to a CSV
+file (one column per parameter and TOF statistic), which also serves as
+checkpoint to resume an interrupted sweep.
+
+Has to be run from inside the compiled model directory
+(e.g. Methanation_local_smart), since it imports kmc_model and kmc_settings.
+
+Example (volcano plot over the binding energies):
+    python3 ../../sweep.py --grid E_C=0:3.4:18 --grid E_O=-1.8:1.4:17 -o volcano.csv
+"""
+
+import argparse
+import csv
+import itertools
+import multiprocessing
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.getcwd())
+
+from kmcos.run import KMC_Model, get_tof_names
+import kmc_settings as settings
+
+
+# model of the pool worker process, every worker has its own Fortran lattice
+_model = None
+
+
+def parse_grid(specs):
+    """
+    Return the parameter names and their values from "NAME=start:stop:num"
+    (inclusive linspace) or "NAME=v1,v2,..." specs.
+    """
+    names, axes = [], []
+    for spec in specs:
+        name, _, values = spec.partition('=')
+        if name not in settings.parameters:
+            raise ValueError(f'{name} is not a parameter of the model')
+        if ':' in values:
+            start, stop, num = values.split(':')
+            axis = np.linspace(float(start), float(stop), int(num)).tolist()
+        else:
+            axis = [float(value) for value in values.split(',')]
+        names.append(name)
+        axes.append(axis)
+    return names, axes
+
+
+def is_steady(tof_samples, window, rtol):
+    """
+    True if the means of every TOF over the last two windows of samples differ
+    by less than rtol (relative to their magnitude).
+    """
+    if len(tof_samples) < 2 * window:
+        return False
+    samples = np.asarray(tof_samples[-2 * window:])
+    previous, last = samples[:window].mean(axis=0), samples[window:].mean(axis=0)
+    scale = np.maximum(np.abs(previous), np.abs(last))
+    return bool(np.all(np.abs(last - previous) <= rtol * np.where(scale > 0, scale, 1.0)))
+
+
+def init_worker(size, random_seed):
+    global _model
+    _model = KMC_Model(size=size, random_seed=random_seed, banner=False)
+
+
+def run_point(task):
+    """
+    Run one grid point: warm-up steps, then batches of sample steps until the
+    TOFs are steady or max_samples is reached. Return the result row.
+    """
+    point, names, options = task
+    for name, value in zip(names, point):
+        settings.parameters[name]['value'] = str(value)
+    _model.deallocate()
+    _model.reset()
+    _model.do_steps(options['warmup_steps'])
+    _model.get_atoms(geometry=False)
+
+    tof_samples = []
+    steady = False
+    while len(tof_samples) < options['max_samples']:
+        _model.do_steps(options['sample_steps'])
+        state = _model.get_atoms(geometry=False)
+        tof_samples.append(np.nan_to_num(np.asarray(state.tof_data, dtype=np.float64)))
+        steady = is_steady(tof_samples, options['window'], options['rtol'])
+        if steady:
+            break
+
+    used = np.asarray(tof_samples[-options['window']:])
+    row = dict(zip(names, point))
+    row.update(steady=int(steady), samples=len(tof_samples), kmc_time=float(state.kmc_time))
+    stderrs = (used.std(axis=0, ddof=1) / np.sqrt(len(used)) if len(used) > 1
+               else np.zeros(used.shape[1]))
+    for tof_name, mean, stderr in zip(get_tof_names(), used.mean(axis=0), stderrs):
+        row[f'{tof_name}_mean'] = mean
+        row[f'{tof_name}_stderr'] = stderr
+    return row
+
+
+def read_checkpoint(path, names):
+    """Return the grid points already in the output file."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, newline='') as output:
+        for row in csv.DictReader(output):
+            try:
+                done.add(tuple(float(row[name]) for name in names))
+            except (KeyError, TypeError, ValueError):
+                # row cut off by an interruption, the point runs again
+                continue
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--grid', action='append', required=True,
+                        help='NAME=start:stop:num or NAME=v1,v2,... (repeat for more parameters)')
+    parser.add_argument('-o', '--output', default='sweep.csv')
+    parser.add_argument('--resume', action='store_true',
+                        help='skip the grid points already in the output file')
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--size', type=int, default=None, help='lattice size (default: model)')
+    parser.add_argument('--seed', type=int, default=None, help='random seed of the workers')
+    parser.add_argument('--warmup-steps', type=int, default=int(1e6))
+    parser.add_argument('--sample-steps', type=int, default=int(1e5))
+    parser.add_argument('--window', type=int, default=10,
+                        help='samples per window of the steady state check')
+    parser.add_argument('--rtol', type=float, default=0.05,
+                        help='relative TOF change between two windows counted as steady')
+    parser.add_argument('--max-samples', type=int, default=200)
+    args = parser.parse_args()
+
+    names, axes = parse_grid(args.grid)
+    done = read_checkpoint(args.output, names) if args.resume else set()
+    points = [point for point in itertools.product(*axes) if point not in done]
+    columns = names + ['steady', 'samples', 'kmc_time'] + [
+        f'{tof_name}_{statistic}' for tof_name in get_tof_names()
+        for statistic in ('mean', 'stderr')]
+    options = dict(warmup_steps=args.warmup_steps, sample_steps=args.sample_steps,
+                   window=args.window, rtol=args.rtol,
+                   max_samples=max(args.max_samples, 2 * args.window))
+    print(f'{len(points)} of {len(points) + len(done)} grid points to run')
+
+    write_header = not (args.resume and os.path.exists(args.output))
+    with open(args.output, 'a' if args.resume else 'w', newline='') as output:
+        writer = csv.DictWriter(output, fieldnames=columns)
+        if write_header:
+            writer.writeheader()
+        context = multiprocessing.get_context('fork')
+        with context.Pool(args.processes, initializer=init_worker,
+                          initargs=(args.size, args.seed)) as pool:
+            tasks = ((point, names, options) for point in points)
+            for n, row in enumerate(pool.imap_unordered(run_point, tasks), 1):
+                writer.writerow(row)
+                output.flush()
+                print(f'[{n}/{len(points)}] ' +
+                      ' '.join(f'{name}={row[name]:g}' for name in names) +
+                      ('' if row['steady'] else ' (not steady)'))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+"""
+Wall-clock timing of phases, shared by start.py (model initialization) and
+methanation/build_cache.py (model build), which must not import start.py.
+"""
+
+import time
+from contextlib import contextmanager
+
+
+@contextmanager
+def timed(phases, name):
+    """Store the wall-clock seconds of the with block as phases[name]."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = time.perf_counter() - start
@@ -0,0 +1,213 @@
+"""
+Recordings of the frames of a simulation: TrajectoryRecorder appends them to a
+recording directory, TrajectoryReader reads them (also offline, without the
+compiled model) for the replay of start.py.
+"""
+
+import bisect
+import io
+import json
+import logging
+import mmap
+import os
+import time
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+# record of a chunk in the index.bin file of a recording
+TRAJECTORY_INDEX = np.dtype([('frame', '<i8'), ('frames', '<i4'), ('time', '<f8'),
+                             ('offset', '<i8'), ('size', '<i8')])
+
+class TrajectoryRecorder:
+    """
+    Appends the frames of a simulation to a recording directory:
+
+    * frames.bin: chunks of up to `chunk_frames` frames (or `flush_seconds` of
+      frames) as compressed npz blocks with the wall-clock and KMC times, TOF and
+      occupation vectors per frame, the species of every site of the first frame
+      and the changed [site, species] pairs of the following frames
+    * index.bin: a TRAJECTORY_INDEX record per chunk (first frame number, number
+      of frames, wall-clock time of the first frame, offset and size in frames.bin)
+    * events.jsonl: the parameter values as they change, with the next frame number
+    * recording.json and initial.json: the model and lattice size, the initial data
+
+    Chunks are written before their index record, so a recording cut off while
+    writing is read up to its last complete chunk. A recording of the same model
+    (initial data key) is continued.
+    """
+    def __init__(self, path, initial_payload, lattice_size, chunk_frames=100, flush_seconds=5.0):
+        self.path = path
+        self.chunk_frames = chunk_frames
+        self.flush_seconds = flush_seconds
+        self._chunk = []
+        self.frame_count = 0
+        self.enabled = self._prepare(initial_payload, lattice_size)
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _prepare(self, initial_payload, lattice_size):
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            if os.path.exists(self._file('recording.json')):
+                with open(self._file('recording.json')) as meta_file:
+                    if json.load(meta_file)['key'] != initial_payload.key:
+                        logger.warning('Recording %s is of another model or lattice size, '
+                                       'frames are not recorded', self.path)
+                        return False
+                index = np.fromfile(self._file('index.bin'), dtype=TRAJECTORY_INDEX)
+                # drop the records of chunks cut off while writing
+                index = index[index['offset'] + index['size'] <=
+                              os.path.getsize(self._file('frames.bin'))]
+                os.truncate(self._file('index.bin'), index.nbytes)
+                self.frame_count = int(index['frames'].sum())
+                logger.info('Continuing recording %s after %d frames', self.path, self.frame_count)
+                return True
+            with open(self._file('initial.json'), 'wb') as initial_file:
+                initial_file.write(initial_payload.json)
+            for name in ('frames.bin', 'index.bin', 'events.jsonl'):
+                open(self._file(name), 'wb').close()
+            with open(self._file('recording.json'), 'w') as meta_file:
+                json.dump({'key': initial_payload.key, 'size': lattice_size}, meta_file)
+            return True
+        except (OSError, ValueError, KeyError) as exc:
+            logger.warning('Cannot record to %s: %s', self.path, exc)
+            return False
+
+    def append(self, kmc_time, species, tof, occupation):
+        """Add a frame, the chunk is written when it is full or old enough."""
+        if not self.enabled:
+            return
+        self._chunk.append((time.time(), kmc_time, np.array(species, dtype=np.uint8),
+                            np.array(tof, dtype=np.float64), np.array(occupation, dtype=np.float64)))
+        if (len(self._chunk) >= self.chunk_frames or
+                self._chunk[-1][0] - self._chunk[0][0] >= self.flush_seconds):
+            self.flush()
+
+    def log_parameters(self, parameters):
+        """Record the {label: value} parameters as changed from the next frame on."""
+        if not self.enabled:
+            return
+        event = {'frame': self.frame_count + len(self._chunk), 'time': time.time(),
+                 'parameters': {label: str(value) for label, value in parameters.items()}}
+        with open(self._file('events.jsonl'), 'a') as events_file:
+            events_file.write(json.dumps(event) + '\n')
+
+    def flush(self):
+        if not self._chunk:
+            return
+        times, kmc_times, species, tofs, occupations = zip(*self._chunk)
+        species = np.stack(species)
+        changed = species[1:] != species[:-1]
+        block = io.BytesIO()
+        np.savez_compressed(
+            block,
+            time=np.array(times),
+            kmc_time=np.array(kmc_times, dtype=np.float64),
+            tof=np.stack(tofs),
+            occupation=np.stack(occupations),
+            config=species[0],
+            change_counts=changed.sum(axis=1).astype(np.int32),
+            change_sites=np.nonzero(changed)[1].astype(np.uint32),
+            change_species=species[1:][changed])
+        data = block.getvalue()
+        try:
+            with open(self._file('frames.bin'), 'ab') as frames_file:
+                offset = frames_file.seek(0, os.SEEK_END)
+                frames_file.write(data)
+            record = np.array([(self.frame_count, len(self._chunk), times[0], offset, len(data))],
+                              dtype=TRAJECTORY_INDEX)
+            with open(self._file('index.bin'), 'ab') as index_file:
+                index_file.write(record.tobytes())
+        except OSError as exc:
+            logger.warning('Cannot write to recording %s, frames are not recorded: %s',
+                           self.path, exc)
+            self.enabled = False
+        self.frame_count += len(self._chunk)
+        self._chunk = []
+
+class TrajectoryReader:
+    """
+    Reads a recording of TrajectoryRecorder through a memory map of its frames:
+    frames by number, the frame number at a time into the recording and the
+    parameter values at a frame number. The last decoded chunk is kept.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'recording.json')) as meta_file:
+            self.meta = json.load(meta_file)
+        with open(os.path.join(path, 'initial.json'), 'rb') as initial_file:
+            self.initial_json = initial_file.read()
+        self._frames_file = open(os.path.join(path, 'frames.bin'), 'rb')
+        size = os.fstat(self._frames_file.fileno()).st_size
+        self._frames = mmap.mmap(self._frames_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        index = np.fromfile(os.path.join(path, 'index.bin'), dtype=TRAJECTORY_INDEX)
+        # only the chunks written completely
+        complete = index['offset'] + index['size'] <= size
+        self.index = index[:len(index) if complete.all() else int(np.argmin(complete))]
+        self._event_frames = []
+        self._event_parameters = []
+        parameters = {}
+        with open(os.path.join(path, 'events.jsonl')) as events_file:
+            for line in events_file:
+                if not line.endswith('\n'):
+                    break
+                event = json.loads(line)
+                parameters = dict(parameters, **event['parameters'])
+                self._event_frames.append(event['frame'])
+                self._event_parameters.append(parameters)
+        self._decoded = (None, None)
+
+    def __len__(self):
+        if not len(self.index):
+            return 0
+        return int(self.index['frame'][-1] + self.index['frames'][-1])
+
+    def close(self):
+        if isinstance(self._frames, mmap.mmap):
+            self._frames.close()
+        self._frames_file.close()
+
+    def _chunk(self, number):
+        """Return the arrays of a chunk, with the species of all its frames."""
+        if self._decoded[0] != number:
+            record = self.index[number]
+            offset, size = int(record['offset']), int(record['size'])
+            block = np.load(io.BytesIO(self._frames[offset:offset + size]))
+            chunk = {name: block[name] for name in ('time', 'kmc_time', 'tof', 'occupation')}
+            species = np.empty((int(record['frames']),) + block['config'].shape, dtype=np.uint8)
+            species[0] = block['config']
+            ends = np.cumsum(block['change_counts'])
+            for n, (start, end) in enumerate(zip(ends - block['change_counts'], ends), start=1):
+                species[n] = species[n - 1]
+                species[n, block['change_sites'][start:end]] = block['change_species'][start:end]
+            chunk['species'] = species
+            self._decoded = (number, chunk)
+        return self._decoded[1]
+
+    def frame(self, number):
+        """Return (time, kmc_time, species, tof, occupation) of a frame."""
+        if not 0 <= number < len(self):
+            raise IndexError(f'Frame {number} of a recording of {len(self)} frames')
+        chunk_number = int(np.searchsorted(self.index['frame'], number, side='right')) - 1
+        chunk = self._chunk(chunk_number)
+        n = number - int(self.index['frame'][chunk_number])
+        return (float(chunk['time'][n]), float(chunk['kmc_time'][n]), chunk['species'][n],
+                chunk['tof'][n], chunk['occupation'][n])
+
+    def seek(self, seconds):
+        """Return the number of the frame recorded `seconds` after the first one."""
+        if not len(self):
+            return 0
+        target = float(self.index['time'][0]) + seconds
+        chunk_number = max(int(np.searchsorted(self.index['time'], target, side='right')) - 1, 0)
+        chunk = self._chunk(chunk_number)
+        n = max(int(np.searchsorted(chunk['time'], target, side='right')) - 1, 0)
+        return int(self.index['frame'][chunk_number]) + n
+
+    def parameters(self, number):
+        """Return the {label: value} parameters recorded up to the frame number."""
+        event = bisect.bisect_right(self._event_frames, number) - 1
+        return self._event_parameters[event] if event >= 0 else {}